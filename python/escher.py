@@ -1,91 +1,380 @@
 # pip3 install attrs
-import json
+import itertools
+from collections import OrderedDict
 
-import cattr
 import numpy as np
 import pygame
 from pygame import gfxdraw
 from pygame.locals import (K_UP, K_DOWN, K_LEFT, K_RIGHT, K_a, K_z, K_x, K_c, K_v, K_o, K_p, K_s, K_l, K_q, K_w,
+                           K_b, K_f, K_g, K_h, K_i, K_r,
                            K_ESCAPE, K_TAB, KEYDOWN, K_LEFTBRACKET, K_RIGHTBRACKET,
                            MOUSEBUTTONDOWN, MOUSEBUTTONUP, QUIT)
 from pygame_button import Button
 
-from escher_class import Pattern, move_points, get_all_patterns
+from escher_maker import (PatternCatalog, Tile, get_tile_color, load_pattern, move_coordinates_all,
+                          pattern_pos_to_screen_pos, save_pattern, screen_pos_to_pattern_pos)
+from escher_maker.core import MAX_PIECE_PIXELS, OutlineIntersections
+from escher_maker.profiler import FrameProfiler
+from escher_maker.projection import get_pixels_per_unit
+from escher_maker.raster import TilingLattice, render_projected_bands
 
 
-class EncodeFromNumpy(json.JSONEncoder):
+class TextRenderer(object):
     """
-    - Serializes python/Numpy objects via customizing json encoder.
+    - Caches fonts per size and rendered text panels, so drawing unchanged text is a single blit.
     - **Usage**
-        - `json.dumps(python_dict, cls=EncodeFromNumpy)` to get json string.
-        - `json.dump(*args, cls=EncodeFromNumpy)` to create a file.json.
+        - `screen.blit(*text_renderer.get_panel(lines, pos, size, width))`
     """
 
-    def default(self, obj):
-        import numpy
-        if isinstance(obj, numpy.ndarray):
-            return {
-                "_kind_": "ndarray",
-                "_value_": obj.tolist()
-            }
-        if isinstance(obj, numpy.integer):
-            return int(obj)
-        elif isinstance(obj, numpy.floating):
-            return float(obj)
-        elif isinstance(obj, range):
-            value = list(obj)
-            return {
-                "_kind_": "range",
-                "_value_": [value[0], value[-1] + 1]
-            }
-        return super(EncodeFromNumpy, self).default(obj)
-
-
-class DecodeToNumpy(json.JSONDecoder):
+    def __init__(self, text_color, background_color, padding=5, max_cached_panels=64):
+        self.text_color = text_color
+        self.background_color = background_color
+        self.padding = padding
+        self.max_cached_panels = max_cached_panels
+        self._fonts = {}
+        self._panels = OrderedDict()
+
+    def get_font(self, size):
+        if size not in self._fonts:
+            self._fonts[size] = pygame.font.Font(pygame.font.get_default_font(), size)
+        return self._fonts[size]
+
+    def get_panel(self, text, pos, size=14, width=100):
+        if not isinstance(text, list):
+            text = [text]
+
+        key = (tuple(text), size, width, self.text_color, self.background_color)
+        if key in self._panels:
+            self._panels.move_to_end(key)
+        else:
+            self._panels[key] = self._render_panel(text, size, width)
+            # changing texts (like the profiling info) should not fill the cache
+            if len(self._panels) > self.max_cached_panels:
+                self._panels.popitem(last=False)
+        return self._panels[key], (pos[0] - self.padding, pos[1] - self.padding)
+
+    def _render_panel(self, text, size, width):
+        font = self.get_font(size)
+        panel = pygame.Surface((width, len(text) * size + 2 * self.padding), pygame.SRCALPHA)
+        pygame.draw.rect(panel, self.background_color, panel.get_rect(), border_radius=5)
+        for i, t in enumerate(text):
+            panel.blit(font.render(t, True, self.text_color, self.background_color),
+                       (self.padding, self.padding + size * i))
+        return panel
+
+
+def get_tile_shapes(pattern, draw_settings, profiler=None):
+    if profiler is None:
+        profiler = FrameProfiler()  # disabled, only used to keep the stages below simple
+
+    with profiler.stage('smoothing'):
+        shape_points = pattern.shape.get_coordinates(smoothed_curves=draw_settings['smoothed_curves'],
+                                                     pixels_per_unit=get_pixels_per_unit(draw_settings))
+    with profiler.stage('transform'):
+        # all tiles at once, the projection is applied to the points of all tiles in a single call
+        tile_points = move_coordinates_all(pattern.tiles, shape_points)
+        tile_points = pattern_pos_to_screen_pos(tile_points.reshape(-1, 2), draw_settings).reshape(tile_points.shape)
+        tile_colors = np.array([get_tile_color(tile, draw_settings) for tile in pattern.tiles])
+    return tile_points, tile_colors
+
+
+def pygame_draw_tile_shapes(screen, tile_points, tile_colors, draw_settings, profiler=None, decimation_steps=None):
+    if profiler is None:
+        profiler = FrameProfiler()
+    if draw_settings['spherical'] and decimation_steps is None:
+        # the steps depend on the largest tile, so to draw part of the tiles pass the steps of all tiles of the frame
+        decimation_steps = get_decimation_steps(tile_points)
+
+    # skip the tiles outside of the clip rect, the pattern can extend far beyond the screen after zooming out
+    clip = screen.get_clip()
+    visible = ((tile_points[:, :, 0].max(axis=1) >= clip.left) & (tile_points[:, :, 0].min(axis=1) < clip.right) &
+               (tile_points[:, :, 1].max(axis=1) >= clip.top) & (tile_points[:, :, 1].min(axis=1) < clip.bottom))
+    tile_points = tile_points[visible]
+    tile_colors = tile_colors[visible]
+    if decimation_steps is not None:
+        # the tiles near the rim are much smaller, they are drawn with a decimated outline or not at all
+        steps = decimation_steps[visible]
+        tile_points = [points[::step] for points, step in zip(tile_points, steps) if step > 0]
+        tile_colors = tile_colors[steps > 0]
+
+    with profiler.stage('polygons'):
+        for shape_points_moved, color in zip(tile_points, tile_colors):
+            # Draw an anti-aliased and filled polygon.
+            # Is the gfxdraw alternative of pygame.draw.polygon(screen, color, shape_points_moved)
+            pygame.gfxdraw.aapolygon(screen, shape_points_moved, color.tolist())
+            pygame.gfxdraw.filled_polygon(screen, shape_points_moved, color.tolist())
+
+    if draw_settings['borders']:
+        with profiler.stage('borders'):
+            for shape_points_moved in tile_points:
+                pygame.gfxdraw.aapolygon(screen, shape_points_moved, (255, 255, 255))
+
+
+def get_decimation_steps(tile_points, max_piece_pixels=MAX_PIECE_PIXELS, min_nr_of_points=8):
+    # Every tile uses the points [::step] of its outline, with step a power of two that keeps the pieces on screen at
+    # most max_piece_pixels long. The largest tiles keep the full outline. Tiles smaller than a pixel get step 0 and
+    # are not drawn.
+    if len(tile_points) == 0:
+        return np.zeros(0, dtype=int)
+    nr_of_points = tile_points.shape[1]
+    pieces = np.diff(tile_points, axis=1, append=tile_points[:, :1])
+    mean_piece_length = np.sum(np.sqrt(np.sum(pieces ** 2, axis=2)), axis=1) / nr_of_points
+    max_step = max(1, nr_of_points // min_nr_of_points)
+    with np.errstate(divide='ignore'):
+        levels = np.floor(np.log2(min(max_piece_pixels, np.max(mean_piece_length)) / mean_piece_length))
+    steps = np.power(2, np.clip(levels, 0, np.floor(np.log2(max_step)))).astype(int)
+    size = np.max(tile_points.max(axis=1) - tile_points.min(axis=1), axis=1)
+    steps[size < 1] = 0
+    return steps
+
+
+class TileSpriteCache(object):
+    """
+    - Rasterizes the shape once for every distinct orientation (rotation and mirror) of the tiles,
+      and draws the pattern by blitting these sprites at the tile positions.
+    - The sprites are recreated when the shape, the zoom or the draw settings change.
+    - Only possible for the flat projection, because the spherical projection deforms every tile differently.
+    """
+
+    def __init__(self):
+        self._sprites_key = None
+        self._sprites = {}
+        self._tiles_key = None
+        self._tile_orientations = []
+
+    @staticmethod
+    def can_draw(draw_settings):
+        return not draw_settings['spherical']
+
+    def draw(self, screen, pattern, draw_settings, tile_indexes=None, profiler=None):
+        if profiler is None:
+            profiler = FrameProfiler()
+
+        with profiler.stage('smoothing'):
+            shape_points = pattern.shape.get_coordinates(smoothed_curves=draw_settings['smoothed_curves'],
+                                                         pixels_per_unit=get_pixels_per_unit(draw_settings))
+        self._update_sprites(shape_points, draw_settings)
+        self._update_tile_orientations(pattern)
+
+        tiles = pattern.tiles
+        if tile_indexes is None:
+            tile_indexes = range(len(tiles))
+        tile_indexes = list(tile_indexes)
+        if len(tile_indexes) == 0:
+            return
+
+        with profiler.stage('transform'):
+            tile_centers = pattern_pos_to_screen_pos(np.array([tiles[i].pos for i in tile_indexes], dtype=float),
+                                                     draw_settings)
+            blits = []
+            for index, center in zip(tile_indexes, tile_centers):
+                orientation = self._tile_orientations[index]
+                if orientation not in self._sprites:
+                    self._sprites[orientation] = self._render_sprite(shape_points, tiles[index], draw_settings)
+                sprite, offset = self._sprites[orientation]
+                blits.append((sprite, (int(round(center[0] + offset[0])), int(round(center[1] + offset[1])))))
+
+        with profiler.stage('polygons'):
+            screen.blits(blits, doreturn=False)
+
+    def _update_sprites(self, shape_points, draw_settings):
+        key = (shape_points.tobytes(), draw_settings['shape_radius'], draw_settings['borders'],
+               draw_settings['tile_color'].tobytes(), draw_settings['tile_flipped_color'].tobytes())
+        if key != self._sprites_key:
+            self._sprites_key = key
+            self._sprites = {}
+
+    def _update_tile_orientations(self, pattern):
+        key = (id(pattern), len(pattern.tiles))
+        if key != self._tiles_key:
+            self._tiles_key = key
+            self._tile_orientations = [(round(tile.rot % (2 * np.pi), 6), tile.mirror) for tile in pattern.tiles]
+
+    @staticmethod
+    def _render_sprite(shape_points, tile, draw_settings):
+        # shape in screen orientation relative to the tile center
+        points = Tile(pos=np.array([0, 0]), rot=tile.rot, mirror=tile.mirror).move_coordinates(shape_points)
+        points = points * [draw_settings['shape_radius'], -draw_settings['shape_radius']]
+        padding = 2
+        offset = np.floor(points.min(axis=0)) - padding
+        points = points - offset
+        size = np.ceil(points.max(axis=0)).astype(int) + padding
+
+        sprite = pygame.Surface(size, pygame.SRCALPHA)
+        color = get_tile_color(tile, draw_settings).tolist()
+        pygame.gfxdraw.aapolygon(sprite, points, color)
+        pygame.gfxdraw.filled_polygon(sprite, points, color)
+        if draw_settings['borders']:
+            pygame.gfxdraw.aapolygon(sprite, points, (255, 255, 255))
+        return sprite, offset
+
+
+class DirtyRegions(object):
     """
-    - Deserilizes JSON object to Python/Numpy's objects.
+    - Remembers what was drawn in the previous frame and returns the screen rectangles that changed.
+    - Changes are collected on a grid of cells, which are merged into a small number of rectangles.
     - **Usage**
-        - `json.loads(json_string,cls=DecodeToNumpy)` from string, use `json.load()` for file.
+        - `rects = dirty_regions.get_dirty_rects(layout, tile_points, circles, panel_boxes, decimation_steps)`, with
+          `decimation_steps` from get_decimation_steps when the tiles are drawn decimated.
+        - `None` means everything has to be redrawn, an empty list means nothing changed.
     """
 
-    def __init__(self, *args, **kwargs):
-        json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
-
-    def object_hook(self, obj):
-        import numpy
-        if '_kind_' not in obj:
-            return obj
-        kind = obj['_kind_']
-        if kind == 'ndarray':
-            return numpy.array(obj['_value_'])
-        elif kind == 'range':
-            value = obj['_value_']
-            return range(value[0], value[-1])
-        return obj
-
-
-def pygame_draw_pattern(screen, pattern, draw_settings):
-    tile_shapes = []
-    shape_points = pattern.shape.get_coordinates(smoothed_curves=draw_settings['smoothed_curves'])
-    for tile in pattern.tiles:
-        if tile.mirror > 0:
-            color = draw_settings['tile_color'].copy()
+    def __init__(self, screen_size, cell_size=32, margin=3):
+        self.screen_size = screen_size
+        self.cell_size = cell_size
+        self.margin = margin  # extra pixels around changes for anti-aliasing and borders
+        self.reset()
+
+    def reset(self):
+        self._layout = None
+        self._tile_points = None
+        self._circles = None
+        self._panel_boxes = None
+        self._decimation_steps = None
+
+    def get_dirty_rects(self, layout, tile_points, circles, panel_boxes, decimation_steps=None):
+        full_redraw = (layout != self._layout or
+                       self._tile_points is None or
+                       tile_points.shape != self._tile_points.shape)
+
+        rects = None
+        if not full_redraw:
+            cells = np.zeros((int(np.ceil(self.screen_size[1] / self.cell_size)),
+                              int(np.ceil(self.screen_size[0] / self.cell_size))), dtype=bool)
+            for box in self._get_tile_boxes(self._tile_points, tile_points, self._decimation_steps, decimation_steps):
+                self._mark_cells(cells, box)
+            for box in self._get_circle_boxes(self._circles, circles):
+                self._mark_cells(cells, box)
+            for box in self._get_panel_boxes(self._panel_boxes, panel_boxes):
+                self._mark_cells(cells, box)
+            rects = self._cells_to_rects(cells)
+
+        self._layout = layout
+        self._tile_points = tile_points
+        self._circles = circles
+        self._panel_boxes = panel_boxes
+        self._decimation_steps = decimation_steps
+        return rects
+
+    def _get_tile_boxes(self, old_points, new_points, old_steps=None, new_steps=None):
+        low = np.minimum(old_points, new_points)
+        high = np.maximum(old_points, new_points)
+        boxes = []
+        if (old_steps is None) != (new_steps is None):
+            return [[0, 0, self.screen_size[0], self.screen_size[1]]]
+        if new_steps is not None:
+            # a tile drawn with another decimation step changes everywhere
+            step_changed = old_steps != new_steps
+            boxes.extend(np.hstack([low[step_changed].min(axis=1), high[step_changed].max(axis=1)]))
+
+        # Every tile is a copy of the same shape, so the same points change in all tiles
+        changed = np.any(np.abs(new_points - old_points) > 1e-3, axis=(0, 2))
+        if not np.any(changed):
+            return boxes
+
+        # The area between the old and new outline is bounded by the changed points and their neighbours on the drawn
+        # outline, which are up to the largest decimation step away
+        max_step = 1 if new_steps is None else max(1, int(np.max(new_steps, initial=1)))
+        widened = changed.copy()
+        for shift in range(1, max_step + 1):
+            widened |= np.roll(changed, shift) | np.roll(changed, -shift)
+        for indexes in get_cyclic_runs(widened):
+            boxes.extend(np.hstack([low[:, indexes].min(axis=1), high[:, indexes].max(axis=1)]))
+        return boxes
+
+    @staticmethod
+    def _get_circle_boxes(old_circles, new_circles):
+        boxes = []
+        if len(old_circles) == len(new_circles):
+            changed = [old != new for old, new in zip(old_circles, new_circles)]
         else:
-            color = draw_settings['tile_flipped_color'].copy()
-        color *= (tile.rot + 1) / (2 * np.pi + 1)
-        shape_points_moved = tile.move_coordinates(shape_points)
-        shape_points_moved = pattern_pos_to_screen_pos(shape_points_moved, draw_settings)
-        tile_shapes.append((shape_points_moved, color))
-
-    for tile_shape in tile_shapes:
-        # Draw an anti-aliased and filled polygon.
-        # Is the gfxdraw alternative of pygame.draw.polygon(screen, color, shape_points_moved)
-        pygame.gfxdraw.aapolygon(screen, tile_shape[0], tile_shape[1].tolist())
-        pygame.gfxdraw.filled_polygon(screen, tile_shape[0], tile_shape[1].tolist())
+            changed = [True] * max(len(old_circles), len(new_circles))
+        for index, circle_changed in enumerate(changed):
+            if circle_changed:
+                for circles in (old_circles, new_circles):
+                    if index < len(circles):
+                        pos, _, size = circles[index]
+                        boxes.append([pos[0] - size, pos[1] - size, pos[0] + size, pos[1] + size])
+        return boxes
+
+    @staticmethod
+    def _get_panel_boxes(old_panel_boxes, new_panel_boxes):
+        # panel boxes are (text, box) pairs, a panel is redrawn when its text or its box changed
+        return [box for _, box in set(old_panel_boxes) ^ set(new_panel_boxes)]
+
+    def _mark_cells(self, cells, box):
+        x0, y0 = (np.floor((np.array(box[:2]) - self.margin) / self.cell_size)).astype(int)
+        x1, y1 = (np.floor((np.array(box[2:]) + self.margin) / self.cell_size)).astype(int) + 1
+        cells[max(y0, 0):max(y1, 0), max(x0, 0):max(x1, 0)] = True
+
+    def _cells_to_rects(self, cells):
+        # horizontal runs of dirty cells, merged with identical runs in the rows below
+        rects = []
+        open_rects = {}
+        for row in range(cells.shape[0] + 1):
+            runs = set()
+            if row < cells.shape[0]:
+                padded = np.concatenate([[False], cells[row], [False]])
+                edges = np.flatnonzero(np.diff(padded.astype(int)))
+                runs = set(zip(edges[::2], edges[1::2]))
+            for run in list(open_rects):
+                if run not in runs:
+                    rects.append(open_rects.pop(run))
+            for run in runs:
+                if run in open_rects:
+                    open_rects[run].height += self.cell_size
+                else:
+                    open_rects[run] = pygame.Rect(run[0] * self.cell_size, row * self.cell_size,
+                                                  (run[1] - run[0]) * self.cell_size, self.cell_size)
+        return rects
+
+
+def get_cyclic_runs(mask):
+    # indexes of consecutive True values, where the last and first element are neighbours
+    if np.all(mask):
+        return [np.arange(len(mask))]
+    start = np.argmin(mask)  # start at a False value such that no run wraps around
+    indexes = np.roll(np.arange(len(mask)), -start)
+    runs = []
+    for is_set, group in itertools.groupby(indexes, key=lambda i: mask[i]):
+        if is_set:
+            runs.append(np.array(list(group)))
+    return runs
+
+
+class ProjectionImageCache(object):
+    """
+    - Draws the pattern by mapping every pixel back to the pattern, which gives correctly curved edges in spherical
+      mode. The image is only recomputed when the shape or the draw settings change.
+    """
 
-    if draw_settings['borders']:
-        for tile_shape in tile_shapes:
-            pygame.gfxdraw.aapolygon(screen, tile_shape[0], (255, 255, 255))
+    def __init__(self):
+        self._key = None
+        self._surface = None
+
+    def draw(self, screen, pattern, draw_settings, profiler=None):
+        if profiler is None:
+            profiler = FrameProfiler()
+
+        with profiler.stage('smoothing'):
+            shape_points = pattern.shape.get_coordinates(smoothed_curves=draw_settings['smoothed_curves'],
+                                                         pixels_per_unit=get_pixels_per_unit(draw_settings))
+        key = (id(pattern), len(pattern.tiles), shape_points.tobytes(), draw_settings['shape_radius'],
+               draw_settings['spherical'], tuple(draw_settings['screen_size']), draw_settings['tile_color'].tobytes(),
+               draw_settings['tile_flipped_color'].tobytes())
+        if key != self._key:
+            self._key = key
+            with profiler.stage('projection'):
+                try:
+                    lattice = TilingLattice(pattern, shape_points)
+                except RuntimeError:
+                    # not enough tiles generated yet
+                    self._surface = None
+                    return
+                image = np.concatenate(list(render_projected_bands(pattern, draw_settings, lattice=lattice)))
+                self._surface = pygame.surfarray.make_surface(image.transpose(1, 0, 2))
+        if self._surface is not None:
+            screen.blit(self._surface, (0, 0))
 
 
 def draw_circle(screen, color, pos, size, filled=True):
@@ -95,41 +384,85 @@ def draw_circle(screen, color, pos, size, filled=True):
         pygame.gfxdraw.filled_circle(screen, int(pos[0]), int(pos[1]), size, color)
 
 
-def spherical_transform(pos):
-    circle_radius = 3
-    c = circle_radius / (circle_radius - 1)
-    norm = np.linalg.norm(pos, axis=1)
-    sel = norm > 0
-    scaling = circle_radius * (1 - np.power(c, -norm[sel])) / norm[sel]
-    pos[sel] = (pos[sel].T * scaling.T).T
-
-    return pos
-
-
-def pattern_pos_to_screen_pos(pos, draw_settings):
-    single_dim = pos.ndim == 1
-    if single_dim:
-        pos = np.array([pos])
-
-    pos_moved = pos.copy()
-    if draw_settings['spherical']:
-        pos_moved = spherical_transform(pos_moved)
+class NodeOverlay(object):
+    """
+    - Collects the circles of the nodes, the nodes linked to the selected node and the selected node,
+      and draws them from pre-rendered circle sprites.
+    - The linked nodes are only searched again when the selection or the nodes of the shape change.
+    """
 
-    pos_moved = move_points(pos_moved, [['scale', [draw_settings['shape_radius'], -draw_settings['shape_radius']]],
-                                        ['translate', [draw_settings['screen_size'][0] // 2,
-                                                       draw_settings['screen_size'][1] // 2]],  # center on screen
-                                        ])
-    if single_dim:
-        pos_moved = pos_moved[0]
-    return pos_moved
+    def __init__(self, node_color, fixed_node_color, selected_color, node_size=5, selected_size=7):
+        self.node_color = node_color
+        self.fixed_node_color = fixed_node_color
+        self.selected_color = selected_color
+        self.node_size = node_size
+        self.selected_size = selected_size
+        self._sprites = {}
+        self._linked_nodes_key = None
+        self._linked_nodes = []
+
+    def _get_linked_nodes(self, shape, selected_node):
+        nodes = shape.get_nodes()
+        key = (id(shape), id(selected_node), len(nodes), len(shape.links))
+        if key != self._linked_nodes_key:
+            self._linked_nodes_key = key
+            self._linked_nodes = shape.get_linked_nodes(selected_node)
+        return nodes, self._linked_nodes
+
+    def get_circles(self, pattern, selected_node, draw_settings, selected_tile=0):
+        nodes, linked_nodes = self._get_linked_nodes(pattern.shape, selected_node)
+
+        positions = [node.pos for node in nodes] + [node.pos for node in linked_nodes] + [selected_node.pos]
+        colors = ([self.node_color if node.movable else self.fixed_node_color for node in nodes] +
+                  [self.node_color] * len(linked_nodes) + [self.selected_color])
+        sizes = [self.node_size] * len(nodes) + [self.selected_size] * (len(linked_nodes) + 1)
+        if selected_tile != 0:
+            positions.append(pattern.tiles[selected_tile].move_coordinates(np.array(selected_node.pos, dtype=float)))
+            colors.append(self.selected_color)
+            sizes.append(self.selected_size)
+
+        screen_positions = pattern_pos_to_screen_pos(np.array(positions, dtype=float), draw_settings).astype(int)
+        return [(tuple(pos), color, size) for pos, color, size in zip(screen_positions.tolist(), colors, sizes)]
+
+    def _get_sprite(self, color, size):
+        if (color, size) not in self._sprites:
+            sprite = pygame.Surface((2 * size + 3, 2 * size + 3), pygame.SRCALPHA)
+            draw_circle(sprite, color, (size + 1, size + 1), size)
+            self._sprites[(color, size)] = sprite
+        return self._sprites[(color, size)]
+
+    def draw(self, screen, circles):
+        screen.blits([(self._get_sprite(color, size), (pos[0] - size - 1, pos[1] - size - 1))
+                      for pos, color, size in circles], doreturn=False)
+
+
+def get_shape_outline(shape, draw_settings):
+    # the outline as it is drawn, the smoothed outlines are cached per level of detail
+    return shape.get_coordinates(smoothed_curves=draw_settings['smoothed_curves'],
+                                 pixels_per_unit=get_pixels_per_unit(draw_settings))
+
+
+def move_node_checked(shape, node, intersections, draw_settings, movement=None, position=None):
+    """
+    - Moves the node like Shape.move_node and updates the crossing edges of the outline, see OutlineIntersections.
+    - With draw_settings['block_crossings'] a move that adds crossing edges is undone, moves that remove crossings
+      of an outline that already crossed itself are allowed.
+    """
+    intersections.update(get_shape_outline(shape, draw_settings))
+    nr_of_crossings = len(intersections.crossings)
+    tables = shape.get_link_tables()
+    previous_positions = tables.get_positions()
+    shape.move_node(node, movement=movement, position=position)
+    intersections.update(get_shape_outline(shape, draw_settings))
+    if draw_settings['block_crossings'] and len(intersections.crossings) > nr_of_crossings:
+        for table_node, previous_position in zip(tables.nodes, previous_positions):
+            table_node.pos = previous_position.copy()
+        intersections.update(get_shape_outline(shape, draw_settings))
 
 
-def screen_pos_to_pattern_pos(pos, draw_settings):
-    return move_points(pos, [['translate', np.array([-draw_settings['screen_size'][0] // 2,
-                                                     -draw_settings['screen_size'][1] // 2], dtype=np.float32)],
-                             ['scale', np.array([1 / draw_settings['shape_radius'],
-                                                 -1 / draw_settings['shape_radius']], dtype=np.float32)]
-                             ])
+def get_visible_max_distance(draw_settings):
+    # max_distance of the tiles that are needed to fill the screen
+    return np.ceil(np.max(draw_settings['screen_size']) / draw_settings['shape_radius']) * 1.5
 
 
 def main():
@@ -141,6 +474,11 @@ def main():
         'borders': True,
         'show_controls': True,
         'spherical': False,
+        'profiling': False,
+        'dirty_rendering': False,
+        'sprites': False,
+        'raster_projection': False,
+        'block_crossings': False,
         'tile_color': np.array([0, 0, 255.0]),
         'tile_flipped_color': np.array([0, 255.0, 0]),
     }
@@ -158,15 +496,11 @@ def main():
         "hover_font_color": ORANGE,
     }
 
-    # create list with all patterns
-    max_distance = np.ceil(np.max(draw_settings['screen_size']) / draw_settings['shape_radius']) * 1.5
-    all_patterns = []
-    for nr_sides in [3, 4, 6]:
-        all_patterns.append(get_all_patterns(nr_sides, max_distance=max_distance))
+    # create list with all patterns, the tiles are generated in the background
+    all_nr_sides = [3, 4, 6]
+    catalog = PatternCatalog(all_nr_sides, max_distance=get_visible_max_distance(draw_settings))
+    all_patterns = [catalog.get_patterns(nr_sides) for nr_sides in all_nr_sides]
 
-    for patterns in all_patterns:
-        for pattern in patterns:
-            print(pattern.combination)
     # create shape for first pattern
     nr_sides_index = 0
     pattern_index = 0
@@ -179,6 +513,7 @@ def main():
     pygame.display.set_caption("Escher maker")
     screen = pygame.display.set_mode(draw_settings['screen_size'])
     clock = pygame.time.Clock()
+    profiler = FrameProfiler(enabled=draw_settings['profiling'])
 
     def button_action():
         draw_settings['borders'] = not draw_settings['borders']
@@ -200,25 +535,60 @@ def main():
     brown = (123, 92, 82)
 
     # Set the texts
-    def draw_text(text, pos, size=14, width=100):
-        if not isinstance(text, list):
-            text = [text]
+    text_renderer = TextRenderer(text_color=brown, background_color=greywhite)
+    dirty_regions = DirtyRegions(draw_settings['screen_size'])
 
-        padding = 5
-        font = pygame.font.Font(pygame.font.get_default_font(), size)
-        pygame.draw.rect(screen, greywhite, (pos[0] - padding,
-                                             pos[1] - padding,
-                                             width,
-                                             len(text) * size + 2 * padding), border_radius=5)
+    sprite_cache = TileSpriteCache()
+    projection_cache = ProjectionImageCache()
+    node_overlay = NodeOverlay(node_color=greywhite, fixed_node_color=greybrown, selected_color=red)
+    intersections = OutlineIntersections()
 
-        for i, t in enumerate(text):
-            screen.blit(font.render(t, True, brown, greywhite), (pos[0], pos[1] + size * i))
+    def draw_scene(tile_points, tile_colors, decimation_steps, circles, panels, clip_rect=None):
+        screen.set_clip(clip_rect)
+        screen.fill(white)
+        sel = slice(None)
+        area = screen.get_clip().inflate(16, 16)
+        if clip_rect is not None:
+            # only draw the tiles that overlap with the dirty rectangle and a margin around it
+            tiles_low = tile_points.min(axis=1)
+            tiles_high = tile_points.max(axis=1)
+            sel = ((tiles_high[:, 0] >= area.left - 1) & (tiles_low[:, 0] <= area.right + 1) &
+                   (tiles_high[:, 1] >= area.top - 1) & (tiles_low[:, 1] <= area.bottom + 1))
+        if draw_settings['raster_projection']:
+            projection_cache.draw(screen, pattern, draw_settings, profiler=profiler)
+        elif draw_settings['sprites'] and sprite_cache.can_draw(draw_settings):
+            tile_indexes = None if clip_rect is None else np.flatnonzero(sel)
+            sprite_cache.draw(screen, pattern, draw_settings, tile_indexes=tile_indexes, profiler=profiler)
+        else:
+            # anti-aliased edges are drawn differently where the clip rect or the screen border cuts them, so the
+            # tiles are drawn on a larger surface and only the rectangle is copied, to get the same pixels for a full
+            # frame and for the dirty rectangles
+            rect = screen.get_clip()
+            surface = pygame.Surface(area.size)
+            surface.fill(white)
+            pygame_draw_tile_shapes(surface, tile_points[sel] - area.topleft, tile_colors[sel], draw_settings,
+                                    profiler=profiler,
+                                    decimation_steps=None if decimation_steps is None else decimation_steps[sel])
+            screen.blit(surface, rect.topleft, area=rect.move(-area.left, -area.top))
+
+        with profiler.stage('nodes'):
+            node_overlay.draw(screen, circles)
+
+        with profiler.stage('text'):
+            for panel, pos in panels:
+                screen.blit(panel, pos)
+        screen.set_clip(None)
 
     # Start loop
     running = True
     follow_mouse = False
+    selected_tile = 0
+    previous_frame_state = None
 
     while running:
+        profiler.start_frame()
+        profiler.begin_stage('input')
+
         # Single key-press
         for event in pygame.event.get():
             button.check_event(event)
@@ -245,6 +615,26 @@ def main():
                 if event.key == K_v:
                     draw_settings['show_controls'] = not draw_settings['show_controls']
 
+                if event.key == K_f:
+                    draw_settings['profiling'] = not draw_settings['profiling']
+                    profiler.toggle()
+
+                if event.key == K_g:
+                    print(f"Saving profile")
+                    profiler.save_csv('profile.csv')
+
+                if event.key == K_h:
+                    draw_settings['raster_projection'] = not draw_settings['raster_projection']
+
+                if event.key == K_b:
+                    draw_settings['sprites'] = not draw_settings['sprites']
+
+                if event.key == K_r:
+                    draw_settings['dirty_rendering'] = not draw_settings['dirty_rendering']
+
+                if event.key == K_i:
+                    draw_settings['block_crossings'] = not draw_settings['block_crossings']
+
                 if event.key == K_q:
                     draw_settings['shape_radius'] *= 1 / 1.1
 
@@ -267,32 +657,34 @@ def main():
 
                 if event.key in (K_o, K_p, K_LEFTBRACKET, K_RIGHTBRACKET):
                     pattern = all_patterns[nr_sides_index][pattern_index]
+                    catalog.prioritize(pattern)
                     selected_node = pattern.shape.get_next_node()
+                    selected_tile = 0
 
                 # Loading and saving
-                # Based on:
-                # https://cattrs.readthedocs.io/en/latest/readme.html
-                # https://stackabuse.com/reading-and-writing-json-to-a-file-in-python/
-                # https://stackoverflow.com/questions/26646362/numpy-array-is-not-json-serializable
-
                 if event.key == K_s:
                     print(f"Saving")
                     print(f"{pattern}")
-                    with open('save.txt', 'w') as outfile:
-                        json.dump(cattr.unstructure(pattern), outfile, cls=EncodeFromNumpy)
+                    save_pattern(pattern, 'save.txt')
 
                 if event.key == K_l:
                     print(f"Loading")
-                    with open('save.txt') as json_file:
-                        pattern = cattr.structure(json.load(json_file, cls=DecodeToNumpy), Pattern)
+                    pattern = load_pattern('save.txt')
                     print(f"{pattern}")
 
             elif event.type == MOUSEBUTTONDOWN and event.button == 1:
                 mouse_pos = pygame.mouse.get_pos()
-                for node in pattern.shape.get_movable_nodes():
-                    if np.linalg.norm(pattern_pos_to_screen_pos(node.pos, draw_settings) - mouse_pos) < 10:
-                        selected_node = node
-                        follow_mouse = True
+                mouse_pattern_pos = screen_pos_to_pattern_pos(mouse_pos, draw_settings)
+                if not np.any(np.isnan(mouse_pattern_pos)):
+                    # nodes can be grabbed in every tile
+                    for _, tile_index, node in pattern.get_nearest_nodes(mouse_pattern_pos, k=8):
+                        node_pos = pattern.tiles[tile_index].move_coordinates(np.array(node.pos, dtype=float))
+                        if node.movable and np.linalg.norm(pattern_pos_to_screen_pos(node_pos, draw_settings) -
+                                                           mouse_pos) < 10:
+                            selected_node = node
+                            selected_tile = tile_index
+                            follow_mouse = True
+                            break
 
             elif event.type == MOUSEBUTTONUP and event.button == 1:
                 follow_mouse = False
@@ -300,64 +692,126 @@ def main():
             elif event.type == QUIT:
                 running = False
 
+        # Grow the pattern when zooming out shows more of it
+        if catalog.has_pattern(pattern):
+            catalog.extend(pattern, get_visible_max_distance(draw_settings))
+        else:
+            pattern.extend(get_visible_max_distance(draw_settings))
+
+        # Add the tiles generated in the background
+        if catalog.update():
+            if pattern in catalog.invalid_patterns:
+                pattern_index = min(pattern_index, len(all_patterns[nr_sides_index]) - 1)
+                pattern = all_patterns[nr_sides_index][pattern_index]
+                catalog.prioritize(pattern)
+                selected_node = pattern.shape.get_next_node()
+                selected_tile = 0
+                follow_mouse = False
+            elif pattern in all_patterns[nr_sides_index]:
+                pattern_index = all_patterns[nr_sides_index].index(pattern)
+
         # Continuous key-press
         pressed_keys = pygame.key.get_pressed()
         move_amount = 5 / draw_settings['shape_radius']
         if pressed_keys[K_UP]:
-            pattern.shape.move_node(selected_node, movement=[0, move_amount])
+            move_node_checked(pattern.shape, selected_node, intersections, draw_settings, movement=[0, move_amount])
 
         if pressed_keys[K_DOWN]:
-            pattern.shape.move_node(selected_node, movement=[0, -move_amount])
+            move_node_checked(pattern.shape, selected_node, intersections, draw_settings, movement=[0, -move_amount])
 
         if pressed_keys[K_LEFT]:
-            pattern.shape.move_node(selected_node, movement=[-move_amount, 0])
+            move_node_checked(pattern.shape, selected_node, intersections, draw_settings, movement=[-move_amount, 0])
 
         if pressed_keys[K_RIGHT]:
-            pattern.shape.move_node(selected_node, movement=[move_amount, 0])
+            move_node_checked(pattern.shape, selected_node, intersections, draw_settings, movement=[move_amount, 0])
 
         if follow_mouse:
             mouse_pos = screen_pos_to_pattern_pos(pygame.mouse.get_pos(), draw_settings)
-            pattern.shape.move_node(selected_node, position=mouse_pos)
-
-        screen.fill(white)
-
-        pygame_draw_pattern(screen, pattern, draw_settings)
-
-        for node_to_draw in pattern.shape.get_nodes():
-            if node_to_draw.movable:
-                color = greywhite
-            else:
-                color = greybrown
-            draw_circle(screen, color, pattern_pos_to_screen_pos(node_to_draw.pos, draw_settings), 5)
-
-        for linked_node in pattern.shape.get_linked_nodes(selected_node):
-            draw_circle(screen, greywhite, pattern_pos_to_screen_pos(linked_node.pos, draw_settings), 7)
-        draw_circle(screen, red, pattern_pos_to_screen_pos(selected_node.pos, draw_settings), 7)
-
+            if not np.any(np.isnan(mouse_pos)):  # outside the sphere in spherical mode
+                # the mouse drags the node in the grabbed tile, which is the same node in the prototype shape
+                move_node_checked(pattern.shape, selected_node, intersections, draw_settings,
+                                  position=pattern.get_prototype_pos(selected_tile, mouse_pos))
+        # also after changing the pattern, the curves or the zoom
+        outline_crosses = intersections.update(get_shape_outline(pattern.shape, draw_settings))
+        profiler.end_stage('input')
+
+        # Collect everything to draw
+        circles = node_overlay.get_circles(pattern, selected_node, draw_settings, selected_tile=selected_tile)
+
+        texts = []
         if draw_settings['show_controls']:
-            draw_text("ESCHER MAKER", (20, 20), size=20, width=180)
-
-            draw_text(["Controls:",
-                       "- Tab key: select node",
-                       "- Arrow key: move node",
-                       "- A-key: add node",
-                       "- Z-key: straight/smooth curves",
-                       "- X-key: border on/off",
-                       "- C-key: flat/spherical",
-                       "- V-key: show/hide control",
-                       "- Q/W-keys: zoom in/out",
-                       "- O/P-keys: change pattern",
-                       "- S/L-key: save & load (WIP)",
-                       "- []-keys: change number of sides"],
-                      (20, 60), width=300)
-            draw_text([f"Info:",
-                       f"Pattern {pattern_index + 1} of {len(all_patterns[nr_sides_index])}",
-                       f"Combination: {pattern.combination}"],
-                      (screen.get_width() - 250, 40), width=240)
-
-        pygame.display.update()
+            texts.append(("ESCHER MAKER", (20, 20), 20, 180))
+
+            texts.append((["Controls:",
+                           "- Tab key: select node",
+                           "- Arrow key: move node",
+                           "- A-key: add node",
+                           "- Z-key: straight/smooth curves",
+                           "- X-key: border on/off",
+                           "- C-key: flat/spherical",
+                           "- V-key: show/hide control",
+                           "- Q/W-keys: zoom in/out",
+                           "- F/G-keys: profiling on/off & save CSV",
+                           "- R-key: full/dirty redraw",
+                           "- B-key: polygon/sprite tiles",
+                           "- H-key: vertex/pixel projection",
+                           "- I-key: allow/block self-crossing shape",
+                           "- O/P-keys: change pattern",
+                           "- S/L-key: save & load (WIP)",
+                           "- []-keys: change number of sides"],
+                          (20, 60), 14, 300))
+            texts.append(([f"Info:",
+                           f"Pattern {pattern_index + 1} of {len(all_patterns[nr_sides_index])}",
+                           f"Combination: {pattern.combination}"] +
+                          (["Shape crosses itself"] if outline_crosses else []),
+                          (screen.get_width() - 250, 40), 14, 240))
+
+        if draw_settings['profiling']:
+            texts.append((profiler.get_text(), (screen.get_width() - 250, 110), 14, 240))
+
+        # Skip the frame when nothing changed since the previous one
+        layout = (id(pattern), str(draw_settings))
+        frame_state = (layout, len(pattern.tiles), circles, repr(texts),
+                       [node.pos.tobytes() for node in pattern.shape.get_nodes()])
+        if draw_settings['dirty_rendering'] and frame_state == previous_frame_state:
+            clock.tick(60)
+            continue
+        previous_frame_state = frame_state
+
+        if draw_settings['dirty_rendering'] or not (draw_settings['sprites'] and sprite_cache.can_draw(draw_settings)):
+            tile_points, tile_colors = get_tile_shapes(pattern, draw_settings, profiler=profiler)
+        else:
+            tile_points, tile_colors = None, None  # the sprites don't need the transformed shapes
+        decimation_steps = None
+        if draw_settings['spherical'] and tile_points is not None:
+            # once for all tiles, so redrawing dirty rectangles decimates the tiles like a full frame
+            decimation_steps = get_decimation_steps(tile_points)
+
+        with profiler.stage('text'):
+            panels = [text_renderer.get_panel(text, pos, size=size, width=width) for text, pos, size, width in texts]
+
+        # Draw
+        if draw_settings['dirty_rendering'] and not draw_settings['raster_projection']:
+            panel_boxes = [(repr(text), (pos[0], pos[1], pos[0] + panel.get_width(), pos[1] + panel.get_height()))
+                           for (text, _, _, _), (panel, pos) in zip(texts, panels)]
+            dirty_rects = dirty_regions.get_dirty_rects(layout, tile_points, circles, panel_boxes, decimation_steps)
+        else:
+            dirty_rects = None
+            dirty_regions.reset()
+
+        if dirty_rects is None:
+            draw_scene(tile_points, tile_colors, decimation_steps, circles, panels)
+            with profiler.stage('display'):
+                pygame.display.update()
+        elif len(dirty_rects) > 0:
+            for dirty_rect in dirty_rects:
+                draw_scene(tile_points, tile_colors, decimation_steps, circles, panels, clip_rect=dirty_rect)
+            with profiler.stage('display'):
+                pygame.display.update(dirty_rects)
+
         clock.tick(60)
 
+    catalog.stop()
     pygame.quit()
 
 
@@ -0,0 +1,20 @@
+"""
+Headless engine of the Escher maker: shapes, tilings, projections, rendering and serialization.
+Importing it does not need a display, pygame or scipy; scipy is imported on the first smoothing or index query.
+"""
+from escher_maker.animation import (MorphRenderer, get_morph_positions, iter_morph_frames, write_gif,
+                                   write_png_sequence)
+from escher_maker.core import (Node, Segment, Link, Shape, Tile, Pattern, TilingGrower, create_shape, make_pattern,
+                               iter_pattern_tiles, get_all_combinations, get_all_patterns, get_tile_color,
+                               move_coordinates_all, outlines_self_intersect, OutlineIntersections, smooth_curve)
+from escher_maker.generator import generate_random_patterns, generate_random_shapes
+from escher_maker.kernels import get_available_backends, get_backend, set_backend
+from escher_maker.projection import pattern_pos_to_screen_pos, screen_pos_to_pattern_pos
+from escher_maker.raster import PngWriter, render_pattern_png, render_projected_png
+from escher_maker.serialization import (EncodeFromNumpy, DecodeToNumpy, save_pattern, load_pattern,
+                                        pattern_from_web_json, pattern_from_nodes, get_pattern_hash,
+                                        read_pattern_file, index_pattern_directory)
+from escher_maker.svg import render_pattern_svg
+from escher_maker.worker import PatternCatalog
+
+__version__ = '0.1.0'
@@ -0,0 +1,171 @@
+import argparse
+import os
+
+import numpy as np
+
+from escher_maker.core import get_lod_subdivisions, get_tile_arrays, get_tile_color
+from escher_maker.projection import get_pixels_per_unit
+from escher_maker.raster import PngWriter, fill_polygon
+from escher_maker.serialization import read_pattern_file
+
+
+def check_same_topology(shape_start, shape_end):
+    # a morph moves nodes only, so both shapes need the same segments, nodes and links
+    tables_start = shape_start.get_link_tables()
+    tables_end = shape_end.get_link_tables()
+    if ([len(segment.nodes) for segment in shape_start.segments] !=
+            [len(segment.nodes) for segment in shape_end.segments] or
+            not np.array_equal(tables_start.sources, tables_end.sources) or
+            not np.array_equal(tables_start.targets, tables_end.targets) or
+            not np.allclose(tables_start.matrices, tables_end.matrices)):
+        raise ValueError("The shapes do not have the same nodes and links")
+
+
+def get_morph_positions(shape_start, shape_end, nr_frames):
+    """
+    - Returns the positions of the nodes of all frames of a morph from shape_start to shape_end, an array of shape
+      (frames, nodes, 2) in the order of the link tables of shape_start.
+    - The nodes are interpolated linearly and the links are applied again to all frames at once, so the frames stay
+      valid tiles also when the saved shapes were slightly off.
+    """
+    check_same_topology(shape_start, shape_end)
+    tables = shape_start.get_link_tables()
+    times = np.linspace(0, 1, nr_frames)[:, np.newaxis, np.newaxis]
+    start = tables.get_positions()
+    end = shape_end.get_link_tables().get_positions()
+    positions = start + times * (end - start)
+    return tables.place_in_orbits(positions)
+
+
+class MorphRenderer(object):
+    """
+    - Renders the frames of a morph of the shape of a pattern with the flat projection.
+    - The tiles only depend on the combination, so they are placed once. The frame, the tile outlines and the
+      intermediate results are allocated once and reused for every frame.
+    - **Usage**
+        - `for frame in renderer.iter_frames(outlines): ...` with `outlines` from `Shape.get_batch_coordinates`. The same
+          uint8 array of shape (height, width, 3) is yielded for every frame, copy it to keep it.
+    """
+
+    def __init__(self, pattern, draw_settings, nr_of_points):
+        self.width, self.height = draw_settings['screen_size']
+        self.background_color = draw_settings.get('background_color', (255, 255, 255))
+        self.tile_colors = np.array([get_tile_color(tile, draw_settings) for tile in pattern.tiles]).astype(np.uint8)
+
+        # Tile.move_coordinates followed by pattern_pos_to_image_pos, as one affine transformation per tile
+        radius = draw_settings['shape_radius']
+        positions, rotations, mirrors = get_tile_arrays(pattern.tiles)
+        c = np.cos(rotations)[:, np.newaxis]
+        s = np.sin(rotations)[:, np.newaxis]
+        m = mirrors[:, np.newaxis]
+        self._xx, self._xy = radius * c * m, radius * s
+        self._yx, self._yy = radius * s * m, -radius * c
+        self._x0 = radius * positions[:, 0:1] + self.width // 2
+        self._y0 = -radius * positions[:, 1:2] + self.height // 2
+
+        self.frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self._tile_points = np.empty((len(pattern.tiles), nr_of_points, 2))
+        self._product = np.empty((len(pattern.tiles), nr_of_points))
+        self._low = np.empty((len(pattern.tiles), 2))
+        self._high = np.empty((len(pattern.tiles), 2))
+
+    def render(self, outline):
+        x = self._tile_points[:, :, 0]
+        y = self._tile_points[:, :, 1]
+        np.multiply(self._xx, outline[:, 0], out=x)
+        x += np.multiply(self._xy, outline[:, 1], out=self._product)
+        x += self._x0
+        np.multiply(self._yx, outline[:, 0], out=y)
+        y += np.multiply(self._yy, outline[:, 1], out=self._product)
+        y += self._y0
+
+        self._tile_points.min(axis=1, out=self._low)
+        self._tile_points.max(axis=1, out=self._high)
+        visible = np.flatnonzero((self._high[:, 0] >= 0) & (self._low[:, 0] <= self.width) &
+                                 (self._high[:, 1] >= 0) & (self._low[:, 1] <= self.height))
+        self.frame[:] = self.background_color
+        for index in visible:
+            fill_polygon(self.frame, self._tile_points[index], self.tile_colors[index])
+        return self.frame
+
+    def iter_frames(self, outlines):
+        for outline in outlines:
+            yield self.render(outline)
+
+
+def iter_morph_frames(pattern, shape_end, draw_settings, nr_frames):
+    # renders the morph from the shape of the pattern to shape_end, see MorphRenderer
+    positions = get_morph_positions(pattern.shape, shape_end, nr_frames)
+    nr_of_subdivisions = 5
+    if draw_settings['smoothed_curves']:
+        # one level of detail for all frames, so the outlines of all frames have the same number of points
+        outlines = pattern.shape.get_batch_coordinates(positions, smoothed_curves=False)
+        edge_lengths = np.linalg.norm(outlines - np.roll(outlines, 1, axis=1), axis=2)
+        nr_of_subdivisions = get_lod_subdivisions(np.max(edge_lengths) * get_pixels_per_unit(draw_settings))
+    outlines = pattern.shape.get_batch_coordinates(positions, draw_settings['smoothed_curves'], nr_of_subdivisions)
+
+    # tiles for the largest shape of all frames
+    reach = np.max(np.linalg.norm(outlines, axis=2))
+    pattern.extend(np.ceil(np.max(draw_settings['screen_size']) / draw_settings['shape_radius']) * 1.5 + reach)
+    renderer = MorphRenderer(pattern, draw_settings, outlines.shape[1])
+    return renderer.iter_frames(outlines)
+
+
+def write_png_sequence(frames, directory, prefix='frame'):
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for index_frame, frame in enumerate(frames):
+        filename = os.path.join(directory, f"{prefix}_{index_frame:04d}.png")
+        with PngWriter(filename, frame.shape[1], frame.shape[0]) as writer:
+            writer.write_rows(frame)
+        filenames.append(filename)
+    return filenames
+
+
+def write_gif(frames, filename, fps=30, loop=True):
+    # Pillow is optional, it is only needed for GIF files. Every frame is reduced to a palette image of one byte per
+    # pixel right away, which Pillow keeps until the file is written.
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("Writing a GIF needs Pillow, install escher-maker[gif]")
+    images = (Image.fromarray(frame).quantize(colors=256, dither=Image.Dither.NONE) for frame in frames)
+    first_image = next(images)
+    first_image.save(filename, save_all=True, append_images=images, duration=int(round(1000 / fps)),
+                     loop=0 if loop else None, optimize=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the morph between two saved shapes of the same pattern "
+                                                 "to a GIF or a sequence of PNG files.")
+    parser.add_argument('start', help="JSON file of the pattern to start from")
+    parser.add_argument('end', help="JSON file of the pattern to end with, with the same combination and nodes")
+    parser.add_argument('output', help="GIF file, or directory for the PNG files")
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--size', type=int, nargs=2, default=[800, 800], help="image width and height")
+    parser.add_argument('--shape-radius', type=float, default=100, help="size of a tile in pixels")
+    parser.add_argument('--straight', action='store_true', help="straight instead of smoothed curves")
+    args = parser.parse_args()
+
+    pattern = read_pattern_file(args.start)
+    pattern_end = read_pattern_file(args.end)
+    if list(pattern.combination) != list(pattern_end.combination):
+        raise SystemExit(f"Combinations {pattern.combination} and {pattern_end.combination} differ")
+    draw_settings = {
+        'shape_radius': args.shape_radius,
+        'screen_size': args.size,
+        'smoothed_curves': not args.straight,
+        'spherical': False,
+        'tile_color': np.array([0, 0, 255.0]),
+        'tile_flipped_color': np.array([0, 255.0, 0]),
+    }
+    frames = iter_morph_frames(pattern, pattern_end.shape, draw_settings, args.frames)
+    if args.output.lower().endswith('.gif'):
+        write_gif(frames, args.output, fps=args.fps)
+    else:
+        write_png_sequence(frames, args.output)
+
+
+if __name__ == "__main__":
+    main()
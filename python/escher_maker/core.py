@@ -0,0 +1,991 @@
+import copy
+import functools
+import itertools
+from collections import deque
+from typing import List
+
+import attr
+import numpy as np
+
+from escher_maker.kernels import IN_SET_SAME, NOT_IN_SET, find_tile, propagate_links
+
+LOD_SUBDIVISIONS = (1, 2, 4, 8, 16, 32)
+MAX_PIECE_PIXELS = 8  # longest piece of an outline on screen, for choosing the level of detail
+
+
+@attr.s(eq=False)
+class Node(object):
+    pos = attr.ib(default=np.array([0, 0]))
+    movable: bool = attr.ib(default=True)
+
+    def move(self, movement=None, position=None):
+        if position is not None:
+            self.pos = position
+        if movement is not None:
+            self.pos += movement
+
+    def __eq__(self, other):
+        return id(self) == id(other)
+
+
+@attr.s()
+class Segment(object):
+    nodes: List[Node] = attr.ib()
+    angle: float = attr.ib(default=0)
+    dist_for_center: float = attr.ib(default=1)
+
+
+@attr.s()
+class Link(object):
+    segment_source: Segment = attr.ib(validator=attr.validators.instance_of(Segment))
+    segment_linked: Segment = attr.ib(validator=attr.validators.instance_of(Segment))
+    flip_x: bool = attr.ib(default=False)
+    flip_y: bool = attr.ib(default=False)
+
+    def get_linked_node(self, node):
+        index_node = self.segment_source.nodes.index(node)
+        if self.flip_x:
+            index_node = len(self.segment_source.nodes) - 1 - index_node
+        return self.segment_linked.nodes[index_node]
+
+    def update_linked_segment3(self, node):
+        matrix, offset = self.get_affine()
+        self.get_linked_node(node).pos = matrix.dot(node.pos) + offset
+
+    def get_affine(self):
+        # The position of a linked node is matrix.dot(pos) + offset: first rotate back such that the segment is
+        # horizontal, do flips, rotate to new angle
+        flips = np.diag([-1 if self.flip_x else 1, -1 if self.flip_y else 1])
+        rotation_linked = rotation_matrix(self.segment_linked.angle)
+        matrix = rotation_linked.dot(flips).dot(rotation_matrix(-self.segment_source.angle))
+        offset = rotation_linked.dot(flips.dot([0, -self.segment_source.dist_for_center]) +
+                                     [0, self.segment_linked.dist_for_center])
+        return matrix, offset
+
+
+@attr.s()
+class Shape(object):
+    segments: List[Segment] = attr.ib()
+    links: List[Link] = attr.ib()
+
+    def __str__(self):
+        output = ""
+        for i, segment in enumerate(self.segments):
+            output += f"Segment {i}: {segment}\n"
+        for i, link in enumerate(self.links):
+            output += f"Link {i}: {link}\n"
+        return output
+
+    def get_nodes(self):
+        # exclude every last node in segment to prevent overlap
+        return [node
+                for segment in self.segments
+                for node in segment.nodes[:-1]]
+
+    def get_movable_nodes(self):
+        return [node for node in self.get_nodes() if node.movable]
+
+    def get_coordinates(self, smoothed_curves, pixels_per_unit=None):
+        # pixels_per_unit selects the level of detail of the smoothed curves, by default 5 subdivisions are used
+        nodes_pos = np.array([node.pos for node in self.get_nodes()], dtype=float)
+        if not smoothed_curves:
+            return nodes_pos
+
+        if pixels_per_unit is None:
+            nr_of_subdivisions = 5
+        else:
+            edge_lengths = np.linalg.norm(nodes_pos - np.roll(nodes_pos, 1, axis=0), axis=1)
+            nr_of_subdivisions = get_lod_subdivisions(np.max(edge_lengths) * pixels_per_unit)
+        return self.get_smooth_coordinates(nr_of_subdivisions)
+
+    def get_smooth_coordinates(self, nr_of_subdivisions=5):
+        # one outline is cached per level of detail, they are recomputed when a node moved
+        nodes_key = np.array([node.pos for node in self.get_nodes()], dtype=float).tobytes()
+        smooth_cache = getattr(self, '_smooth_cache', None)
+        if smooth_cache is None or smooth_cache[0] != nodes_key:
+            smooth_cache = (nodes_key, {})
+            self._smooth_cache = smooth_cache
+        outlines = smooth_cache[1]
+        if nr_of_subdivisions in outlines:
+            return outlines[nr_of_subdivisions]
+
+        smooth_coordinates = []
+        for index_side in range(int(len(self.segments) / 2)):
+            nodes0 = self.segments[2 * index_side].nodes
+            nodes1 = self.segments[2 * index_side + 1].nodes
+            nodes_side = nodes0 + nodes1[1:]
+            smooth_coordinates.append(smooth_curve(np.array([node.pos for node in nodes_side]),
+                                                   nr_of_subdivisions=nr_of_subdivisions))
+        outline = np.concatenate(smooth_coordinates)
+        outline.flags.writeable = False  # shared by all callers
+        outlines[nr_of_subdivisions] = outline
+        return outline
+
+    def get_batch_coordinates(self, positions, smoothed_curves, nr_of_subdivisions=5):
+        # Same as get_coordinates, for many positions of the nodes at once, e.g. the frames of an animation.
+        # positions has shape (shapes, nodes, 2) in the order of the link tables, the result (shapes, points, 2).
+        tables = self.get_link_tables()
+        if not smoothed_curves:
+            return positions[:, [tables.node_indexes[id(node)] for node in self.get_nodes()]]
+
+        outlines = []
+        for index_side in range(int(len(self.segments) / 2)):
+            nodes_side = self.segments[2 * index_side].nodes + self.segments[2 * index_side + 1].nodes[1:]
+            side_positions = positions[:, [tables.node_indexes[id(node)] for node in nodes_side]]
+            # smooth_curve interpolates along the first axis, so all shapes are smoothed in one call
+            outlines.append(smooth_curve(side_positions.swapaxes(0, 1), nr_of_subdivisions=nr_of_subdivisions))
+        return np.concatenate(outlines).swapaxes(0, 1)
+
+    def move_node(self, node, movement=None, position=None):
+        if node.movable:
+            node.move(movement, position)
+
+            # update linked segment(s), breadth first over the flat arrays of all nodes and links
+            tables = self.get_link_tables()
+            index_node = tables.node_indexes.get(id(node))
+            if index_node is None:
+                return
+            positions = tables.get_positions()
+            updated = propagate_links(positions, tables.sources, tables.targets, tables.matrices, tables.offsets,
+                                      index_node)
+            for index_updated in updated[1:]:
+                tables.nodes[index_updated].pos = positions[index_updated].copy()
+
+    def move_nodes(self, nodes, movements=None, positions=None):
+        """
+        - Moves many nodes at once, e.g. to add noise to all movable nodes, with the same result as calling move_node
+          for every node in order.
+        - `movements` or `positions` is an array with one row per node. Nodes that are not movable are skipped.
+        - Every node that move_node updates is an affine image of the moved node, see LinkTables.get_reach, so when the
+          moved nodes do not reach the same nodes all of them are updated in one vectorized step. Otherwise they are
+          moved one after the other.
+        """
+        tables = self.get_link_tables()
+        starts, reach_indexes, reach_matrices, reach_offsets = tables.get_reach()
+        all_positions = tables.get_positions()
+        indexes = np.array([tables.node_indexes.get(id(node), -1) if node.movable else -1 for node in nodes],
+                           dtype=np.int64)
+        selected = indexes >= 0
+        indexes = indexes[selected]
+        if positions is not None:
+            positions = np.asarray(positions, dtype=float).reshape(-1, 2)[selected]
+        else:
+            movements = np.asarray(movements, dtype=float).reshape(-1, 2)[selected]
+
+        # the entries of get_reach of all moved nodes
+        sizes = starts[indexes + 1] - starts[indexes]
+        entries = np.repeat(starts[indexes] - np.cumsum(sizes) + sizes, sizes) + np.arange(np.sum(sizes))
+        updated = reach_indexes[entries]
+        if len(np.unique(updated)) == len(updated):
+            new_positions = positions if positions is not None else all_positions[indexes] + movements
+            owners = np.repeat(np.arange(len(indexes)), sizes)
+            all_positions[updated] = (np.einsum('nij,nj->ni', reach_matrices[entries], new_positions[owners]) +
+                                      reach_offsets[entries])
+        else:
+            # a node moves the nodes moved before it, like move_node in a loop
+            for index_moved, index_node in enumerate(indexes):
+                if positions is not None:
+                    new_position = positions[index_moved]
+                else:
+                    new_position = all_positions[index_node] + movements[index_moved]
+                reach = slice(starts[index_node], starts[index_node + 1])
+                all_positions[reach_indexes[reach]] = reach_matrices[reach].dot(new_position) + reach_offsets[reach]
+            updated = np.unique(updated)
+        for index_updated in updated:
+            tables.nodes[index_updated].pos = all_positions[index_updated].copy()
+
+    def get_link_tables(self):
+        # rebuilt when nodes or links are added or replaced
+        key = (tuple(id(node) for segment in self.segments for node in segment.nodes),
+               tuple(id(link) for link in self.links))
+        tables = getattr(self, '_link_tables', None)
+        if tables is None or tables.key != key:
+            tables = LinkTables(self, key)
+            self._link_tables = tables
+        return tables
+
+    def add_node(self, node):
+        """
+        - Adds a node halfway between the node and the next node of its segment, and the linked node in every
+          segment that is linked to it, directly or through other segments.
+        - The segments are visited breadth first over the links. Only the new nodes are inserted, so the other nodes,
+          including the corners shared with the neighbouring segments, stay the same objects.
+        """
+        for segment in self.segments:
+            if node in segment.nodes[:-1]:  # don't match last node because it overlaps with the next segment
+                index_node = segment.nodes.index(node) + 1
+                new_node = Node(pos=(segment.nodes[index_node - 1].pos + segment.nodes[index_node].pos) / 2,
+                                movable=node.movable)
+                segment.nodes.insert(index_node, new_node)
+                break
+        else:
+            return
+
+        links_by_source = {}
+        for link in self.links:
+            links_by_source.setdefault(id(link.segment_source), []).append(link)
+        visited = {id(segment)}
+        queue = deque([(segment, index_node, new_node)])
+        while queue:
+            segment, index_node, new_node = queue.popleft()
+            for link in links_by_source.get(id(segment), []):
+                linked_segment = link.segment_linked
+                if id(linked_segment) in visited:
+                    continue
+                visited.add(id(linked_segment))
+                # the linked segment has one node less, with flip_x its nodes are in reversed order
+                index_linked = len(linked_segment.nodes) - index_node if link.flip_x else index_node
+                matrix, offset = link.get_affine()
+                linked_node = Node(pos=matrix.dot(new_node.pos) + offset, movable=new_node.movable)
+                linked_segment.nodes.insert(index_linked, linked_node)
+                queue.append((linked_segment, index_linked, linked_node))
+
+    def get_next_node(self, node=None):
+        movable_nodes = self.get_movable_nodes()
+        if len(movable_nodes) == 0:
+            raise RuntimeError("No movable nodes")
+
+        if node in movable_nodes:
+            return movable_nodes[(movable_nodes.index(node) + 1) % len(movable_nodes)]
+        else:
+            return movable_nodes[0]
+
+    def get_linked_nodes(self, node):
+        nodes = [node]
+        for _node in nodes:
+            for link in self.links:
+                if _node in link.segment_source.nodes:
+                    linked_node = link.get_linked_node(_node)
+                    if linked_node not in nodes:
+                        nodes.append(linked_node)
+        return nodes
+
+
+class LinkTables(object):
+    """
+    - Flat arrays of the nodes of a shape and of the links between them, for the kernels in escher_maker.kernels.
+    - Link i moves node targets[i] to matrices[i].dot(pos[sources[i]]) + offsets[i], in the same order as
+      Shape.links and the nodes of their source segments.
+    """
+
+    def __init__(self, shape, key):
+        self.key = key
+        self.nodes = []  # also keeps the nodes alive, so the ids in the key are not reused
+        self.node_indexes = {}
+        for segment in shape.segments:
+            for node in segment.nodes:
+                if id(node) not in self.node_indexes:
+                    self.node_indexes[id(node)] = len(self.nodes)
+                    self.nodes.append(node)
+
+        sources, targets, matrices, offsets = [], [], [], []
+        for link in shape.links:
+            matrix, offset = link.get_affine()
+            for node in link.segment_source.nodes:
+                sources.append(self.node_indexes[id(node)])
+                targets.append(self.node_indexes[id(link.get_linked_node(node))])
+                matrices.append(matrix)
+                offsets.append(offset)
+        self.sources = np.array(sources, dtype=np.int64)
+        self.targets = np.array(targets, dtype=np.int64)
+        self.matrices = np.array(matrices, dtype=float).reshape(-1, 2, 2)
+        self.offsets = np.array(offsets, dtype=float).reshape(-1, 2)
+        self._orbits = None
+        self._reach = None
+
+    def get_positions(self):
+        return np.array([node.pos for node in self.nodes], dtype=float).reshape(-1, 2)
+
+    def _get_outgoing(self):
+        # the indexes of the links of every node, in the order the kernels follow them
+        outgoing = [[] for _ in self.nodes]
+        for index_link, source in enumerate(self.sources):
+            outgoing[source].append(index_link)
+        return outgoing
+
+    def get_reach(self):
+        """
+        - The nodes that move_node updates when a node is moved: breadth first from the node over the links, in the
+          same order as propagate_links, so every reached node is an affine image of the moved node along the same
+          path. The links do not always go both ways, so a node does not always reach all nodes of its orbit.
+        - Returns (starts, indexes, matrices, offsets): node i reaches indexes[starts[i]:starts[i + 1]], the first
+          one is node i itself, and node indexes[k] is at matrices[k].dot(pos[i]) + offsets[k]. Computed once per
+          link tables.
+        """
+        if self._reach is None:
+            outgoing = self._get_outgoing()
+            starts, indexes, matrices, offsets = [0], [], [], []
+            for start in range(len(self.nodes)):
+                reached = {start: (np.eye(2), np.zeros(2))}
+                queue = deque([start])
+                while queue:
+                    source = queue.popleft()
+                    matrix, offset = reached[source]
+                    for index_link in outgoing[source]:
+                        target = self.targets[index_link]
+                        if target not in reached:
+                            reached[target] = (self.matrices[index_link].dot(matrix),
+                                               self.matrices[index_link].dot(offset) + self.offsets[index_link])
+                            queue.append(target)
+                for target, (matrix, offset) in reached.items():
+                    indexes.append(target)
+                    matrices.append(matrix)
+                    offsets.append(offset)
+                starts.append(len(indexes))
+            self._reach = (np.array(starts, dtype=np.int64), np.array(indexes, dtype=np.int64),
+                           np.array(matrices, dtype=float).reshape(-1, 2, 2),
+                           np.array(offsets, dtype=float).reshape(-1, 2))
+        return self._reach
+
+    def get_orbits(self):
+        """
+        - The nodes that are linked to each other, directly or through other nodes, form an orbit. Every node is
+          visited breadth first from the first node of its orbit, the root, following the links.
+        - Returns (roots, matrices, offsets, free): node i is at matrices[i].dot(pos[roots[i]]) + offsets[i]. Computed
+          once per link tables.
+        - The maps only follow the links of the breadth first tree. When the links around a cycle, e.g. around a
+          corner, do not add up to the identity, or link to another orbit, the root can not be placed freely. free[i]
+          is False for the nodes of these orbits.
+        """
+        if self._orbits is None:
+            roots = np.arange(len(self.nodes))
+            matrices = np.tile(np.eye(2), (len(self.nodes), 1, 1))
+            offsets = np.zeros((len(self.nodes), 2))
+            outgoing = self._get_outgoing()
+            reached = np.zeros(len(self.nodes), dtype=bool)
+            for root in range(len(self.nodes)):
+                if reached[root]:
+                    continue
+                reached[root] = True
+                queue = deque([root])
+                while queue:
+                    source = queue.popleft()
+                    for index_link in outgoing[source]:
+                        target = self.targets[index_link]
+                        if not reached[target]:
+                            reached[target] = True
+                            roots[target] = root
+                            matrices[target] = self.matrices[index_link].dot(matrices[source])
+                            offsets[target] = self.matrices[index_link].dot(offsets[source]) + self.offsets[index_link]
+                            queue.append(target)
+            # the links that do not hold for every position of the root
+            linked_matrices = np.einsum('nij,njk->nik', self.matrices, matrices[self.sources])
+            linked_offsets = np.einsum('nij,nj->ni', self.matrices, offsets[self.sources]) + self.offsets
+            closed = ((roots[self.sources] == roots[self.targets]) &
+                      np.all(np.abs(linked_matrices - matrices[self.targets]) < 1e-9, axis=(1, 2)) &
+                      np.all(np.abs(linked_offsets - offsets[self.targets]) < 1e-9, axis=1))
+            free = ~np.isin(roots, np.concatenate([roots[self.sources[~closed]], roots[self.targets[~closed]]]))
+            self._orbits = (roots, matrices, offsets, free)
+        return self._orbits
+
+    def place_in_orbits(self, positions):
+        # Places every node relative to the root of its orbit, for the nodes of many shapes at once. positions has
+        # shape (..., nodes, 2) in the order of self.nodes, the result has the same shape. All links hold when the
+        # roots of the orbits that are not free are where they were in a valid shape.
+        roots, matrices, offsets, _ = self.get_orbits()
+        return np.einsum('nij,...nj->...ni', matrices, positions[..., roots, :]) + offsets
+
+
+@attr.s()
+class Tile(object):
+    pos = attr.ib(default=np.array([0, 0]))
+    rot: float = attr.ib(default=0)
+    mirror: int = attr.ib(default=1)
+
+    def move_coordinates(self, coordinates):
+        return move_points(coordinates,
+                           [['scale', [self.mirror, 1]],
+                            ['rotate', self.rot],
+                            ['translate', self.pos]])
+
+
+@attr.s(eq=False)
+class Pattern(object):
+    tiles: List[Tile] = attr.ib()
+    combination = attr.ib()
+    shape: Shape = attr.ib()
+
+    def __eq__(self, other):
+        return id(self) == id(other)
+
+    def get_index(self):
+        index = getattr(self, '_index', None)
+        if index is None or index.pattern is not self:
+            index = PatternIndex(self)
+            self._index = index
+        index.update()
+        return index
+
+    def get_prototype_pos(self, tile_index, pos):
+        return self.get_index().get_prototype_pos(tile_index, pos)
+
+    def get_tile_at(self, pos, smoothed_curves=True):
+        return self.get_index().get_tile_at(pos, smoothed_curves=smoothed_curves)
+
+    def get_nearest_nodes(self, pos, k=1):
+        return self.get_index().get_nearest_nodes(pos, k=k)
+
+    def extend(self, max_distance, radius=1):
+        # add the tiles up to max_distance, continuing from the tiles that are already there
+        grower = getattr(self, '_grower', None)
+        if grower is None or grower.tiles is not self.tiles:
+            grower = TilingGrower(self.combination, radius=radius, tiles=self.tiles)
+            self._grower = grower
+        return list(grower.grow(max_distance))
+
+
+class PatternIndex(object):
+    """
+    - KD-trees over the tile centers and over the nodes of every tile copy, for fast queries by position.
+    - Inverse transforms of all tiles, to map positions in any tile back to the prototype shape.
+    - The tile data is rebuilt when tiles are added. The node tree is only rebuilt when nodes were moved and it is
+      queried: the first `get_nearest_nodes` after a drag transforms the nodes of every tile copy again, which takes
+      time linear in tiles times nodes. Queries after that take logarithmic time.
+    - **Usage**
+        - `pattern.get_tile_at(pos)` returns the index of the tile that contains pos, or None.
+        - `pattern.get_nearest_nodes(pos, k)` returns a list of (distance, tile index, node) of the nearest nodes.
+        - `pattern.get_prototype_pos(tile_index, pos)` maps a position in a tile to the prototype shape.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self._tiles_key = None
+        self._nodes_key = None
+
+    def update(self):
+        from scipy.spatial import cKDTree  # imported on first use, it is slow to import
+        tiles_key = len(self.pattern.tiles)
+        if tiles_key != self._tiles_key:
+            self._tiles_key = tiles_key
+            positions, rotations, mirrors = get_tile_arrays(self.pattern.tiles)
+            self.tile_tree = cKDTree(positions)
+            # inverse of Tile.move_coordinates: translate back, rotate back, then mirror
+            c, s = np.cos(rotations), np.sin(rotations)
+            self.tile_positions = positions
+            self.tile_inverse_matrices = np.stack([np.stack([mirrors * c, -mirrors * s], axis=-1),
+                                                   np.stack([s, c], axis=-1)], axis=1)
+            self._nodes_key = None
+
+        self.nodes = self.pattern.shape.get_nodes()
+        node_positions = np.array([node.pos for node in self.nodes], dtype=float)
+        nodes_key = node_positions.tobytes()
+        if nodes_key != self._nodes_key:
+            self._nodes_key = nodes_key
+            self._node_positions = node_positions
+            self.node_tree = None
+            self._outlines = {}
+
+    def get_prototype_pos(self, tile_index, pos):
+        # works for a single tile index and position, and for arrays of them
+        pos = np.asarray(pos, dtype=float) - self.tile_positions[tile_index]
+        return np.einsum('...ij,...j->...i', self.tile_inverse_matrices[tile_index], pos)
+
+    def get_tile_at(self, pos, smoothed_curves=True, k=8):
+        if smoothed_curves not in self._outlines:
+            self._outlines[smoothed_curves] = self.pattern.shape.get_coordinates(smoothed_curves=smoothed_curves)
+        outline = self._outlines[smoothed_curves]
+
+        # a tile can extend beyond its neighbours' centers, so check the nearest few tiles
+        _, tile_indexes = self.tile_tree.query(pos, k=min(k, len(self.pattern.tiles)))
+        for tile_index in np.atleast_1d(tile_indexes):
+            if points_in_polygon(self.get_prototype_pos(tile_index, pos)[np.newaxis], outline)[0]:
+                return int(tile_index)
+        return None
+
+    def get_nearest_nodes(self, pos, k=1):
+        if self.node_tree is None:
+            from scipy.spatial import cKDTree
+            self.node_tree = cKDTree(move_coordinates_all(self.pattern.tiles, self._node_positions).reshape(-1, 2))
+        distances, indexes = self.node_tree.query(pos, k=min(k, self.node_tree.n))
+        return [(distance, int(index) // len(self.nodes), self.nodes[index % len(self.nodes)])
+                for distance, index in zip(np.atleast_1d(distances), np.atleast_1d(indexes))]
+
+
+def get_tile_color(tile, draw_settings):
+    if tile.mirror > 0:
+        color = draw_settings['tile_color'].copy()
+    else:
+        color = draw_settings['tile_flipped_color'].copy()
+    color *= (tile.rot + 1) / (2 * np.pi + 1)
+    return color
+
+
+def create_shape(combination=None, radius=1, nodes_per_segment=3):
+    if combination is None:
+        combination = [2, 3, 0, 1]
+    nr_sides = len(combination)
+    height = radius * np.cos(np.pi / nr_sides)
+    segment_per_side = 2
+    nodes_per_side = (nodes_per_segment - 1) * segment_per_side  # minus 1 because of the overlapping node per segment
+
+    # create nodes
+    left_corner_pos = np.array([-np.tan(np.pi / nr_sides) * height, height])
+    right_corner_pos = left_corner_pos * [-1, 1]
+    # right corner is an overlapping node, added for correct spacing and then removed
+    nodes_pos = np.linspace(left_corner_pos, right_corner_pos, nodes_per_side + 1)[:-1]
+    nodes = []
+    for index_side in range(nr_sides):
+        angle = 2 * np.pi / nr_sides * index_side
+        for i, node_pos in enumerate(nodes_pos):
+            nodes.append(Node(pos=rotation_matrix(angle).dot(node_pos), movable=True))  # (i != 0)))
+    # create segments
+    segments = []
+    for index_side in range(nr_sides):
+        angle = 2 * np.pi / nr_sides * index_side
+        for s in range(segment_per_side):
+            index_segment = index_side * segment_per_side + s
+            index_nodes = [(index_segment * (nodes_per_segment - 1) + i) % len(nodes) for i in range(nodes_per_segment)]
+            segments.append(Segment(nodes=[nodes[i] for i in index_nodes],
+                                    angle=angle,
+                                    dist_for_center=height))
+
+    # create links
+    links = []
+    for index_side in range(nr_sides):
+        if index_side == combination[index_side]:  # side linked to itself
+            links.append(Link(segment_source=segments[2 * index_side],
+                              segment_linked=segments[2 * index_side + 1],
+                              flip_x=True,
+                              flip_y=True))
+            links.append(Link(segment_source=segments[2 * index_side + 1],
+                              segment_linked=segments[2 * index_side],
+                              flip_x=True,
+                              flip_y=True))
+            segments[2 * index_side + 1].nodes[0].movable = False
+        elif combination[index_side] >= 0:  # side linked to other side of shape
+            links.append(Link(segment_source=segments[2 * index_side],
+                              segment_linked=segments[2 * combination[index_side] + 1],
+                              flip_x=True,
+                              flip_y=True))
+            links.append(Link(segment_source=segments[2 * index_side + 1],
+                              segment_linked=segments[2 * combination[index_side]],
+                              flip_x=True,
+                              flip_y=True))
+        else:  # side linked to other side of flipped shape
+            links.append(Link(segment_source=segments[2 * index_side],
+                              segment_linked=segments[2 * (-combination[index_side] - 1)],
+                              flip_x=False,
+                              flip_y=True))
+            links.append(Link(segment_source=segments[2 * index_side + 1],
+                              segment_linked=segments[2 * (-combination[index_side] - 1) + 1],
+                              flip_x=False,
+                              flip_y=True))
+
+    return Shape(segments=segments, links=links)
+
+
+def move_points(points, actions):
+    points = copy.deepcopy(points)
+    for action in actions:
+        if action[0] == 'translate':
+            points += np.array(action[1])
+        elif action[0] == 'rotate':
+            points = rotation_matrix(action[1]).dot(points.T).T
+        elif action[0] == 'scale':
+            points *= np.array(action[1])
+        elif action[0] == 'smooth':
+            points = smooth_curve(points, nr_of_subdivisions=action[1])
+        else:
+            raise NotImplementedError(f"Action {action[0]} is not defined")
+    return points
+
+
+def get_tile_arrays(tiles):
+    positions = np.array([tile.pos for tile in tiles], dtype=float).reshape(-1, 2)
+    rotations = np.array([tile.rot for tile in tiles], dtype=float)
+    mirrors = np.array([tile.mirror for tile in tiles], dtype=float)
+    return positions, rotations, mirrors
+
+
+def move_coordinates_all(tiles, coordinates):
+    # Same as Tile.move_coordinates, for all tiles at once. Returns an array of shape (tiles, points, 2)
+    positions, rotations, mirrors = get_tile_arrays(tiles)
+    c = np.cos(rotations)[:, np.newaxis]
+    s = np.sin(rotations)[:, np.newaxis]
+    x = mirrors[:, np.newaxis] * coordinates[np.newaxis, :, 0]
+    y = coordinates[np.newaxis, :, 1]
+    return np.stack([c * x + s * y + positions[:, 0:1],
+                     -s * x + c * y + positions[:, 1:2]], axis=-1)
+
+
+def outlines_self_intersect(outlines, max_pairs=1000000):
+    """
+    - Returns for every outline in `outlines`, an array of shape (..., points, 2), whether two of its edges cross.
+    - All pairs of edges that do not share a point are tested at once, O(points^2) per outline. Edges that only
+      touch or overlap on a line are not counted, so repeated points, e.g. the corners of smoothed outlines, are fine.
+    """
+    outlines = np.asarray(outlines, dtype=float)
+    nr_of_points = outlines.shape[-2]
+    first, second = np.triu_indices(nr_of_points, k=2)
+    not_neighbours = (second - first) % nr_of_points != nr_of_points - 1  # the last edge is next to the first one
+    first, second = first[not_neighbours], second[not_neighbours]
+
+    # a limited number of pairs at once, to limit the memory use for many or long outlines
+    flat_outlines = outlines.reshape(-1, nr_of_points, 2)
+    chunk_size = max(1, max_pairs // max(len(first), 1))
+    intersect = np.zeros(len(flat_outlines), dtype=bool)
+    for index in range(0, len(flat_outlines), chunk_size):
+        intersect[index:index + chunk_size] = _outlines_self_intersect(flat_outlines[index:index + chunk_size],
+                                                                       first, second)
+    return intersect.reshape(outlines.shape[:-2])
+
+
+def _outlines_self_intersect(outlines, first, second):
+    start = outlines
+    end = np.roll(outlines, -1, axis=-2)
+    crossing = segments_cross(start[..., first, :], end[..., first, :], start[..., second, :], end[..., second, :])
+    return np.any(crossing, axis=-1)
+
+
+def segments_cross(a, b, c, d):
+    # whether the segments a-b and c-d cross, for arrays of segments; touching segments do not cross
+    def orientation(p, q, r):
+        return ((q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) -
+                (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0]))
+
+    return ((orientation(a, b, c) * orientation(a, b, d) < 0) &
+            (orientation(c, d, a) * orientation(c, d, b) < 0))
+
+
+class OutlineIntersections(object):
+    """
+    - Keeps the pairs of crossing edges of an outline up to date while its points move, e.g. while dragging a node.
+    - The edges are put in a uniform grid of cells larger than the longest edge. After a change only the edges
+      with a moved point, which are the edges of the moved orbit of nodes, are tested against the edges in their
+      cells, all at once.
+    - Starts over when the number of points changes, e.g. after adding a node or for another level of detail.
+    - **Usage**
+        - `intersections.update(shape.get_coordinates(smoothed_curves))` after every change, returns True when the
+          outline crosses itself. `intersections.crossings` is the set of pairs of crossing edges.
+    """
+
+    def __init__(self):
+        self.crossings = set()
+        self._outline = None
+        self._cell_size = None
+
+    def update(self, outline):
+        outline = np.array(outline, dtype=float)
+        max_edge_length = np.max(np.abs(outline - np.roll(outline, -1, axis=0)))
+        if self._outline is None or len(outline) != len(self._outline) or max_edge_length > self._cell_size:
+            # with some room for edges that grow while dragging
+            self._cell_size = max(2 * max_edge_length, 1e-9)
+            self.crossings = set()
+            changed_edges = np.arange(len(outline))
+        else:
+            moved = np.flatnonzero(np.any(outline != self._outline, axis=1))
+            if len(moved) == 0:
+                return len(self.crossings) > 0
+            # an edge starts at its point, so a moved point changes its own edge and the previous one
+            changed_edges = np.unique(np.concatenate([moved, (moved - 1) % len(outline)]))
+        self._outline = outline
+
+        changed = set(changed_edges.tolist())
+        self.crossings = {pair for pair in self.crossings if pair[0] not in changed and pair[1] not in changed}
+        first, second = self._get_candidates(changed_edges)
+        nr_of_edges = len(outline)
+        crossing = segments_cross(outline[first], outline[(first + 1) % nr_of_edges],
+                                  outline[second], outline[(second + 1) % nr_of_edges])
+        self.crossings.update(zip(first[crossing].tolist(), second[crossing].tolist()))
+        return len(self.crossings) > 0
+
+    def _get_cells(self):
+        # the cells that the bounding box of every edge overlaps, at most 2 x 2 as no edge is wider than a cell,
+        # as arrays of edge indexes and cell keys sorted by key
+        start = self._outline
+        end = np.roll(self._outline, -1, axis=0)
+        low = np.floor(np.minimum(start, end) / self._cell_size).astype(np.int64)
+        high = np.floor(np.maximum(start, end) / self._cell_size).astype(np.int64)
+        edges, keys = [], []
+        for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            inside = (low[:, 0] + dx <= high[:, 0]) & (low[:, 1] + dy <= high[:, 1])
+            edges.append(np.flatnonzero(inside))
+            keys.append((low[inside, 0] + dx) * (1 << 32) + (low[inside, 1] + dy))
+        edges = np.concatenate(edges)
+        keys = np.concatenate(keys)
+        order = np.argsort(keys, kind='stable')
+        return edges[order], keys[order]
+
+    def _get_candidates(self, changed_edges):
+        # all pairs of a changed edge and another edge in the same cell that is not next to it, each pair once
+        edges, keys = self._get_cells()
+        is_changed = np.zeros(len(self._outline), dtype=bool)
+        is_changed[changed_edges] = True
+        changed_edges, changed_keys = edges[is_changed[edges]], keys[is_changed[edges]]
+        left = np.searchsorted(keys, changed_keys, side='left')
+        right = np.searchsorted(keys, changed_keys, side='right')
+        counts = right - left
+        first = np.repeat(changed_edges, counts)
+        second = edges[np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts, counts) +
+                       np.repeat(left, counts)]
+
+        nr_of_edges = len(self._outline)
+        first, second = np.minimum(first, second), np.maximum(first, second)
+        not_neighbours = (second - first > 1) & (second - first != nr_of_edges - 1)
+        pairs = np.unique(first[not_neighbours] * nr_of_edges + second[not_neighbours])
+        return pairs // nr_of_edges, pairs % nr_of_edges
+
+
+def points_in_polygon(points, polygon):
+    # even-odd rule, for all points at once
+    x0 = polygon[:, 0]
+    y0 = polygon[:, 1]
+    x1 = np.roll(x0, -1)
+    y1 = np.roll(y0, -1)
+    px = points[:, 0:1]
+    py = points[:, 1:2]
+    crossing = (y0 <= py) != (y1 <= py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_crossing = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+    return np.sum(crossing & (px < x_crossing), axis=1) % 2 == 1
+
+
+def get_lod_subdivisions(edge_length_pixels, max_piece_pixels=MAX_PIECE_PIXELS):
+    # smallest level of detail for which the pieces of the smoothed curve are at most max_piece_pixels long
+    for nr_of_subdivisions in LOD_SUBDIVISIONS:
+        if edge_length_pixels / nr_of_subdivisions <= max_piece_pixels:
+            return nr_of_subdivisions
+    return LOD_SUBDIVISIONS[-1]
+
+
+def smooth_curve(points, nr_of_subdivisions=5, close_loop=False):
+    # based on https://stackoverflow.com/a/27650158
+    nr_of_points = len(points)
+    if close_loop:
+        x = np.concatenate([points[-3:-1, :], points, points[1:3, :]])
+        ti = np.linspace(2, nr_of_points + 1, nr_of_subdivisions * nr_of_points)
+    else:
+        x = points
+        ti = np.linspace(0, nr_of_points - 1, nr_of_subdivisions * nr_of_points)
+
+    from scipy.interpolate import interp1d  # imported on first use, it is slow to import
+    t = np.arange(len(x))
+    xi = interp1d(t, x, axis=0, kind='cubic', fill_value='extrapolate')(ti)
+    return np.array(xi)
+
+
+def rotation_matrix(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array(((c, s), (-s, c)))
+
+
+def get_all_combinations(nr_sides, with_mirror=True):
+    combinations = find_combinations(nr_sides)
+    combinations = remove_similar_combinations(combinations)
+    if with_mirror:
+        # flipping the links of a pair of sides can give a combination that is a rotation or reflection of another one
+        combinations = remove_similar_combinations(add_mirror_combinations(combinations))
+    return combinations
+
+
+def get_all_patterns(nr_sides, with_mirror=True, radius=1, max_distance=3.5):
+    combinations = get_all_combinations(nr_sides, with_mirror=with_mirror)
+
+    patterns = []
+    for combination in combinations:
+        pattern = make_pattern(combination, radius=radius, max_distance=max_distance, error_if_not_valid=False)
+        if pattern:
+            patterns.append(pattern)
+    return patterns
+
+
+def find_combinations(nr_sides, combination=None):
+    if combination is None:
+        combination = []
+    index = len(combination)
+    if index == nr_sides:
+        return [combination]
+
+    if index in combination:
+        combination.append(combination.index(index))
+        return find_combinations(nr_sides, combination)
+
+    combinations = []
+    for i in (set(range(index, nr_sides)) - set(combination)):
+        combination_copy = combination.copy()
+        combination_copy.append(i)
+        combinations.extend(find_combinations(nr_sides, combination_copy))
+    return combinations
+
+
+def add_mirror_combinations(combinations):
+    new_combinations = []
+    nr_sides = len(combinations[0])
+    for combination in combinations:
+        indexes = np.arange(nr_sides)
+        indexes_of_pairs = indexes[indexes < combination]
+        sets_to_mirror = [com
+                          for L in range(len(indexes_of_pairs))
+                          for com in itertools.combinations(indexes_of_pairs, L + 1)]
+        for set_to_mirror in sets_to_mirror:
+            new_combination = combination.copy()
+            for index_pair in set_to_mirror:
+                new_combination[combination[index_pair]] = -combination[combination[index_pair]] - 1
+                new_combination[index_pair] = -combination[index_pair] - 1
+            new_combinations.append(new_combination)
+    combinations.extend(new_combinations)
+    return combinations
+
+
+def remove_similar_combinations(combinations):
+    # keeps the first combination of every set of combinations that are rotations or reflections of each other
+    seen = set()
+    unique_combinations = []
+    for combination in combinations:
+        canonical = get_canonical_combination(combination)
+        if canonical not in seen:
+            seen.add(canonical)
+            unique_combinations.append(combination)
+    return unique_combinations
+
+
+def get_canonical_combination(combination):
+    """
+    - Returns the same tuple for all combinations that are rotations or reflections of each other, so combinations are
+      compared with `get_canonical_combination(a) == get_canonical_combination(b)`.
+    - Relabeling the sides with side -> (side + k) % n (rotation) or side -> (k - side) % n (reflection) gives a
+      combination of the same pattern, rotated or mirrored. A side linked to side j of the flipped shape, stored as
+      -j - 1, stays linked to the flipped shape: it becomes -relabel(j) - 1.
+    - The smallest of the 2n relabeled combinations is returned, O(n^2) and cached per combination.
+    """
+    return _get_canonical_combination(tuple(int(side) for side in combination))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_canonical_combination(combination):
+    nr_sides = len(combination)
+    candidates = []
+    for direction in (1, -1):
+        for offset in range(nr_sides):
+            relabel = [(direction * side + offset) % nr_sides for side in range(nr_sides)]
+            candidate = [0] * nr_sides
+            for index_side, side in enumerate(combination):
+                candidate[relabel[index_side]] = relabel[side] if side >= 0 else -relabel[-side - 1] - 1
+            candidates.append(tuple(candidate))
+    return min(candidates)
+
+
+def tile_in_set(tiles, new_tile, eps=1e-5):
+    positions, rotations, mirrors = get_tile_arrays(tiles)
+    found = find_tile(positions, rotations, mirrors, len(tiles), new_tile.pos, new_tile.rot, new_tile.mirror, eps=eps)
+    return found != NOT_IN_SET, found == IN_SET_SAME
+
+
+def index_to_rotation(index, nr_sides):
+    return 2 * np.pi / nr_sides * index
+
+
+class TilingGrower(object):
+    """
+    - Breadth first construction of the tiles of a pattern, that can be continued to a larger max_distance.
+    - Tiles with a neighbour outside of max_distance are kept as the frontier, growing to a larger max_distance only
+      processes the frontier instead of starting over.
+    - Raises a RuntimeError as soon as the combination turns out not to give a valid pattern.
+    """
+
+    def __init__(self, combination, radius=1, tiles=None):
+        self.combination = combination
+        self.nr_sides = len(combination)
+        self.height = radius * np.cos(np.pi / self.nr_sides)
+        self.max_distance = 0
+        if tiles is None:
+            self.tiles = [Tile()]
+            self._queue = deque([0])
+            self._frontier = []
+        else:
+            # continue from existing tiles, all of them could still have missing neighbours
+            self.tiles = tiles
+            self._queue = deque()
+            self._frontier = list(range(len(tiles)))
+        self._update_tile_arrays()
+
+    def _update_tile_arrays(self):
+        # arrays with spare capacity for checking if a tile is already in the set
+        capacity = max(64, 2 * len(self.tiles))
+        self._positions = np.zeros((capacity, 2))
+        self._rotations = np.zeros(capacity)
+        self._mirrors = np.zeros(capacity)
+        positions, rotations, mirrors = get_tile_arrays(self.tiles)
+        self._positions[:len(self.tiles)] = positions
+        self._rotations[:len(self.tiles)] = rotations
+        self._mirrors[:len(self.tiles)] = mirrors
+        self._nr_of_tiles = len(self.tiles)
+
+    def _add_tile(self, tile):
+        if self._nr_of_tiles == len(self._rotations):
+            self.tiles.append(tile)
+            self._update_tile_arrays()
+            return
+        self._positions[self._nr_of_tiles] = tile.pos
+        self._rotations[self._nr_of_tiles] = tile.rot
+        self._mirrors[self._nr_of_tiles] = tile.mirror
+        self._nr_of_tiles += 1
+        self.tiles.append(tile)
+
+    def grow(self, max_distance):
+        # yields the new tiles one by one, the tiles are appended to self.tiles
+        if self._nr_of_tiles != len(self.tiles):
+            self._update_tile_arrays()  # tiles were added from outside
+        if max_distance > self.max_distance:
+            self.max_distance = max_distance
+            self._queue.extend(self._frontier)
+            self._frontier = []
+
+        while len(self._queue) > 0:
+            # the tile is only removed from the queue when all its sides are done, so a generator that is not run
+            # to the end can be continued later
+            tile = self.tiles[self._queue[0]]
+            on_frontier = False
+            for index_side in range(self.nr_sides):
+                direction = tile.rot + index_to_rotation(index_side, self.nr_sides) * tile.mirror
+                if self.combination[index_side] >= 0:
+                    side_match = self.combination[index_side]
+                    mirror = tile.mirror
+                else:
+                    side_match = -self.combination[index_side] - 1
+                    mirror = -tile.mirror
+
+                new_pos = tile.pos + 2 * self.height * np.array([np.sin(direction), np.cos(direction)])
+                if np.linalg.norm(new_pos) >= self.max_distance * self.height:
+                    on_frontier = True
+                    continue
+                new_tile = Tile(pos=new_pos,
+                                rot=(direction - index_to_rotation(side_match, self.nr_sides) * mirror + np.pi) % (
+                                        2 * np.pi),
+                                mirror=mirror)
+                found = find_tile(self._positions, self._rotations, self._mirrors, self._nr_of_tiles,
+                                  new_tile.pos, new_tile.rot, new_tile.mirror)
+                if found == NOT_IN_SET:
+                    self._add_tile(new_tile)
+                    self._queue.append(len(self.tiles) - 1)
+                    yield new_tile
+                elif found != IN_SET_SAME:
+                    raise RuntimeError(f"Combination {self.combination} does not result in a valid pattern")
+            index_tile = self._queue.popleft()
+            if on_frontier:
+                self._frontier.append(index_tile)
+
+
+def iter_pattern_tiles(combination, radius=1, max_distance=4.5, grower=None):
+    # Yields the tiles of the pattern one by one, starting with the prototype tile.
+    # Raises a RuntimeError as soon as the combination turns out not to give a valid pattern.
+    if grower is None:
+        grower = TilingGrower(combination, radius=radius)
+    yield grower.tiles[0]
+    yield from grower.grow(max_distance)
+
+
+def make_pattern(combination, radius=1, error_if_not_valid=True, max_distance=4.5):
+    shape = create_shape(combination=combination, radius=radius)
+    grower = TilingGrower(combination, radius=radius)
+    try:
+        for _ in iter_pattern_tiles(combination, max_distance=max_distance, grower=grower):
+            pass
+    except RuntimeError:
+        if error_if_not_valid:
+            raise
+        return None
+
+    pattern = Pattern(tiles=grower.tiles, combination=combination, shape=shape)
+    pattern._grower = grower
+    return pattern
@@ -0,0 +1,150 @@
+import argparse
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from escher_maker.core import (Link, Node, OutlineIntersections, Pattern, Segment, Shape, Tile, create_shape,
+                               get_all_combinations, make_pattern, outlines_self_intersect)
+from escher_maker.serialization import save_pattern
+
+
+def generate_random_shapes(combination, nr_variants, nodes_per_segment=3, perturbation=0.3, seed=0, batch_size=64,
+                           max_attempts=None, smoothed_curves=False, radius=1):
+    """
+    - Returns up to `nr_variants` random shapes for the combination and the number of attempts, starting from
+      create_shape with `nodes_per_segment` nodes per segment.
+    - Every orbit of linked nodes gets a normal distributed movement with standard deviation `perturbation`, in units
+      of the distance between neighbouring nodes, and the linked nodes follow, so every variant gives a valid tiling.
+      Orbits that are not free, see LinkTables.get_orbits, e.g. some corners, stay in place.
+    - Variants are generated in batches of `batch_size` with one array of node positions per batch. Variants whose
+      outline crosses itself, or with `smoothed_curves` whose smoothed outline crosses itself, are rejected, until
+      `nr_variants` are found or `max_attempts` variants were tried.
+    - The same seed gives the same shapes.
+    """
+    if max_attempts is None:
+        max_attempts = 100 * nr_variants
+    rng = np.random.default_rng(seed)
+    shape = create_shape(combination=combination, radius=radius, nodes_per_segment=nodes_per_segment)
+    tables = shape.get_link_tables()
+    roots, _, _, free = tables.get_orbits()
+    base_positions = tables.get_positions()
+    # orbits with a node that is not movable stay in place, and so do orbits whose links only hold in place
+    movable_roots = free.copy()
+    for index_node, node in enumerate(tables.nodes):
+        if not node.movable:
+            movable_roots[roots[index_node]] = False
+    movable_roots &= roots == np.arange(len(tables.nodes))
+    outline = shape.get_coordinates(smoothed_curves=False)
+    node_distance = np.min(np.linalg.norm(outline - np.roll(outline, 1, axis=0), axis=1))
+
+    shapes = []
+    attempts = 0
+    while len(shapes) < nr_variants and attempts < max_attempts:
+        nr_of_shapes = min(batch_size, max_attempts - attempts)
+        positions = np.repeat(base_positions[np.newaxis], nr_of_shapes, axis=0)
+        positions[:, movable_roots] += rng.normal(0, perturbation * node_distance,
+                                                  (nr_of_shapes, np.sum(movable_roots), 2))
+        positions = tables.place_in_orbits(positions)
+
+        valid = ~outlines_self_intersect(shape.get_batch_coordinates(positions, smoothed_curves=False))
+        if smoothed_curves and np.any(valid):
+            # the smoothed outlines are long, a grid is faster than testing all pairs of edges
+            outlines = shape.get_batch_coordinates(positions[valid], smoothed_curves=True)
+            valid[valid] = [not OutlineIntersections().update(outline) for outline in outlines]
+        for index_shape in range(nr_of_shapes):
+            if len(shapes) == nr_variants:
+                break
+            attempts += 1
+            if valid[index_shape]:
+                shapes.append(_copy_shape(shape, tables, positions[index_shape]))
+    return shapes, attempts
+
+
+def _copy_shape(shape, tables, positions):
+    # a copy of the shape with new node positions, much faster than copy.deepcopy
+    nodes = {id(node): Node(pos=position, movable=node.movable) for node, position in zip(tables.nodes, positions)}
+    segments = {id(segment): Segment(nodes=[nodes[id(node)] for node in segment.nodes], angle=segment.angle,
+                                     dist_for_center=segment.dist_for_center)
+                for segment in shape.segments}
+    links = [Link(segment_source=segments[id(link.segment_source)], segment_linked=segments[id(link.segment_linked)],
+                  flip_x=link.flip_x, flip_y=link.flip_y)
+             for link in shape.links]
+    return Shape(segments=list(segments.values()), links=links)
+
+
+def _generate_patterns(args):
+    combination, nr_variants, options = args
+    # most combinations do not tile the plane, the same check as get_all_patterns
+    if make_pattern(combination, radius=options.get('radius', 1), error_if_not_valid=False, max_distance=3.5) is None:
+        return [], 0, False
+    shapes, attempts = generate_random_shapes(combination, nr_variants, **options)
+    return [Pattern(tiles=[Tile()], combination=list(combination), shape=shape) for shape in shapes], attempts, True
+
+
+def generate_random_patterns(combinations, nr_variants, processes=1, seed=0, **options):
+    """
+    - Generates `nr_variants` random shapes per combination, see `generate_random_shapes`, as patterns with only the
+      prototype tile. Use Pattern.extend to add the tiles.
+    - Combinations that do not tile the plane are skipped, their list of patterns is empty.
+    - With `processes` > 1 the combinations are divided over a pool of processes. Every combination has its own
+      seed, derived from `seed` and its index, so the result does not depend on the number of processes.
+    - Returns the list of patterns per combination and statistics: the number of combinations that tile the plane,
+      shapes, attempts, the rejected fraction, the time and the number of shapes per second.
+    """
+    jobs = [(combination, nr_variants, dict(options, seed=[seed, index_combination]))
+            for index_combination, combination in enumerate(combinations)]
+    start_time = time.perf_counter()
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_generate_patterns, jobs)
+    else:
+        results = [_generate_patterns(job) for job in jobs]
+    total_time = time.perf_counter() - start_time
+
+    patterns = [result[0] for result in results]
+    nr_of_shapes = sum(len(result[0]) for result in results)
+    attempts = sum(result[1] for result in results)
+    stats = {
+        'combinations': sum(result[2] for result in results),
+        'shapes': nr_of_shapes,
+        'attempts': attempts,
+        'rejected': 1 - nr_of_shapes / attempts if attempts else 0,
+        'time': total_time,
+        'shapes_per_second': nr_of_shapes / total_time if total_time > 0 else float('inf'),
+    }
+    return patterns, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate random shapes for all combinations with the given numbers "
+                                                 "of sides, e.g. for galleries or load tests.")
+    parser.add_argument('--nr-sides', type=int, nargs='+', default=[3, 4, 6])
+    parser.add_argument('--variants', type=int, default=10, help="number of shapes per combination")
+    parser.add_argument('--nodes-per-segment', type=int, default=3)
+    parser.add_argument('--perturbation', type=float, default=0.3,
+                        help="standard deviation of the node movements, relative to the distance between nodes")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--smoothed', action='store_true', help="also reject shapes whose smoothed outline crosses")
+    parser.add_argument('--output', help="directory to save the patterns as JSON")
+    args = parser.parse_args()
+
+    combinations = [combination for nr_sides in args.nr_sides for combination in get_all_combinations(nr_sides)]
+    patterns, stats = generate_random_patterns(combinations, args.variants, processes=args.processes, seed=args.seed,
+                                               nodes_per_segment=args.nodes_per_segment,
+                                               perturbation=args.perturbation, smoothed_curves=args.smoothed)
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        for combination, combination_patterns in zip(combinations, patterns):
+            name = '_'.join(str(side) for side in combination)
+            for index_pattern, pattern in enumerate(combination_patterns):
+                save_pattern(pattern, os.path.join(args.output, f"random_{name}_{index_pattern + 1}.json"))
+    print(f"{stats['shapes']} shapes of {stats['combinations']} combinations that tile, of {len(combinations)} "
+          f"combinations, in {stats['time']:.2f} s, "
+          f"{stats['shapes_per_second']:.0f} shapes/s, {stats['rejected']:.0%} of {stats['attempts']} rejected")
+
+
+if __name__ == "__main__":
+    main()
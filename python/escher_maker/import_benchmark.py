@@ -0,0 +1,54 @@
+import argparse
+import json
+import subprocess
+import sys
+
+CORE_MODULES = ['escher_maker', 'escher_maker.core', 'escher_maker.kernels', 'escher_maker.projection',
+                'escher_maker.raster', 'escher_maker.worker', 'escher_maker.serialization', 'escher_maker.svg',
+                'escher_maker.service', 'escher_maker.animation', 'escher_maker.generator']
+HEAVY_MODULES = ['scipy', 'pygame', 'cattr', 'numba']
+
+MEASURE_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps([duration, [name for name in {heavy_modules} if name in sys.modules]]))
+"""
+
+
+def measure_import(module, repeat=5):
+    # every import is done in a new interpreter, so it is a cold start; the fastest run is the least noisy
+    durations = []
+    heavy_imports = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', MEASURE_SCRIPT.format(module=module,
+                                                                             heavy_modules=HEAVY_MODULES)],
+                                capture_output=True, text=True, check=True).stdout
+        duration, heavy_imports = json.loads(output.strip().splitlines()[-1])
+        durations.append(duration)
+    return min(durations), heavy_imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the cold import time of the core modules, exits with an "
+                                                 "error when a module is slower than the target or imports scipy, "
+                                                 "pygame, cattr or numba.")
+    parser.add_argument('modules', nargs='*', default=CORE_MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target-ms', type=float, default=300)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        duration, heavy_imports = measure_import(module, repeat=args.repeat)
+        too_slow = 1000 * duration > args.target_ms
+        failed = failed or too_slow or len(heavy_imports) > 0
+        print(f"{module:30s} {1000 * duration:7.1f} ms"
+              f"{'  SLOW' if too_slow else ''}"
+              f"{'  imports ' + ', '.join(heavy_imports) if len(heavy_imports) > 0 else ''}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
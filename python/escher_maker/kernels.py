@@ -0,0 +1,135 @@
+import importlib.util
+import os
+
+import numpy as np
+
+BACKENDS = ('numpy', 'numba')
+NOT_IN_SET, IN_SET_DIFFERENT, IN_SET_SAME = 0, 1, 2
+
+
+def get_available_backends():
+    # numba is slow to import, it is only imported when the first kernel is compiled
+    return [backend for backend in BACKENDS if backend != 'numba' or importlib.util.find_spec('numba') is not None]
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend):
+    """
+    - 'numpy': uncompiled fallback, always available. The tile lookup is vectorized, the link propagation is a
+      breadth first loop in Python over the links of each node.
+    - 'numba': compiled loops, only available when numba can be imported.
+    - The default is taken from the environment variable ESCHER_BACKEND, else numba when it is installed.
+    """
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend {backend} is not one of {BACKENDS}")
+    if backend not in get_available_backends():
+        raise RuntimeError(f"Backend {backend} is not available, install numba to use it")
+    _backend = backend
+
+
+# Kernels on flat arrays. The loop versions are compiled by numba, the numpy versions are the fallback and give the
+# same results, both use the same arithmetic per element.
+
+def _find_tile_loop(positions, rotations, mirrors, nr_of_tiles, pos, rot, mirror, eps):
+    for index in range(nr_of_tiles):
+        if abs(positions[index, 0] - pos[0]) < eps and abs(positions[index, 1] - pos[1]) < eps:
+            diff_rot = abs(rotations[index] - rot)
+            if diff_rot > np.pi:
+                diff_rot -= 2 * np.pi
+            if diff_rot < eps and mirrors[index] == mirror:
+                return IN_SET_SAME
+            return IN_SET_DIFFERENT
+    return NOT_IN_SET
+
+
+def _find_tile_numpy(positions, rotations, mirrors, nr_of_tiles, pos, rot, mirror, eps):
+    diff_pos = np.abs(positions[:nr_of_tiles] - pos)
+    indexes = np.flatnonzero((diff_pos[:, 0] < eps) & (diff_pos[:, 1] < eps))
+    if len(indexes) == 0:
+        return NOT_IN_SET
+    index = indexes[0]
+    diff_rot = abs(rotations[index] - rot)
+    if diff_rot > np.pi:
+        diff_rot -= 2 * np.pi
+    if diff_rot < eps and mirrors[index] == mirror:
+        return IN_SET_SAME
+    return IN_SET_DIFFERENT
+
+
+def _propagate_links_loop(positions, sources, targets, matrices, offsets, start):
+    updated = np.zeros(len(positions), dtype=np.bool_)
+    updated[start] = True
+    order = np.empty(len(positions), dtype=np.int64)
+    order[0] = start
+    head, tail = 0, 1
+    while head < tail:
+        source = order[head]
+        head += 1
+        for index_link in range(len(sources)):
+            target = targets[index_link]
+            if sources[index_link] == source and not updated[target]:
+                x, y = positions[source, 0], positions[source, 1]
+                positions[target, 0] = matrices[index_link, 0, 0] * x + matrices[index_link, 0, 1] * y + \
+                    offsets[index_link, 0]
+                positions[target, 1] = matrices[index_link, 1, 0] * x + matrices[index_link, 1, 1] * y + \
+                    offsets[index_link, 1]
+                updated[target] = True
+                order[tail] = target
+                tail += 1
+    return order[:tail]
+
+
+def _propagate_links_numpy(positions, sources, targets, matrices, offsets, start):
+    updated = np.zeros(len(positions), dtype=bool)
+    updated[start] = True
+    order = [start]
+    head = 0
+    while head < len(order):
+        source = order[head]
+        head += 1
+        for index_link in np.flatnonzero(sources == source):
+            target = targets[index_link]
+            if not updated[target]:
+                x, y = positions[source, 0], positions[source, 1]
+                positions[target, 0] = matrices[index_link, 0, 0] * x + matrices[index_link, 0, 1] * y + \
+                    offsets[index_link, 0]
+                positions[target, 1] = matrices[index_link, 1, 0] * x + matrices[index_link, 1, 1] * y + \
+                    offsets[index_link, 1]
+                updated[target] = True
+                order.append(target)
+    return np.array(order, dtype=np.int64)
+
+
+_numba_kernels = {}
+
+
+def _get_numba_kernel(kernel):
+    if kernel not in _numba_kernels:
+        import numba
+        _numba_kernels[kernel] = numba.njit(cache=True)(kernel)
+    return _numba_kernels[kernel]
+
+
+def find_tile(positions, rotations, mirrors, nr_of_tiles, pos, rot, mirror, eps=1e-5):
+    # Checks the first nr_of_tiles tiles for a tile at pos, returns NOT_IN_SET, IN_SET_DIFFERENT or IN_SET_SAME.
+    pos = np.asarray(pos, dtype=float)
+    if _backend == 'numba':
+        return _get_numba_kernel(_find_tile_loop)(positions, rotations, mirrors, nr_of_tiles, pos, float(rot),
+                                                  float(mirror), eps)
+    return _find_tile_numpy(positions, rotations, mirrors, nr_of_tiles, pos, rot, mirror, eps)
+
+
+def propagate_links(positions, sources, targets, matrices, offsets, start):
+    # Breadth first update of the nodes linked to node start: positions[target] = matrix @ positions[source] + offset.
+    # positions is changed in place, returns the indexes of the updated nodes in the order they were updated.
+    if _backend == 'numba':
+        return _get_numba_kernel(_propagate_links_loop)(positions, sources, targets, matrices, offsets, start)
+    return _propagate_links_numpy(positions, sources, targets, matrices, offsets, start)
+
+
+_backend = None
+set_backend(os.environ.get('ESCHER_BACKEND', get_available_backends()[-1]))
@@ -0,0 +1,91 @@
+import contextlib
+import csv
+import time
+from collections import deque
+
+
+class FrameProfiler(object):
+    """
+    - Times named stages of a frame and keeps a rolling history of the last frames.
+    - **Usage**
+        - `profiler.start_frame()` at the top of the loop, the previous frame is closed at that moment.
+        - `with profiler.stage('name'):` around the code to time, or `begin_stage`/`end_stage` for long blocks.
+        - `profiler.save_csv(filename)` to dump all recorded frames.
+    """
+
+    def __init__(self, history=60, enabled=False):
+        self.enabled = enabled
+        self.history = deque(maxlen=history)
+        self.reset()
+
+    def reset(self):
+        self.stage_names = []
+        self.history.clear()
+        self.records = []
+        self._frame = None
+        self._frame_start = None
+        self._stage_starts = {}
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.reset()
+
+    def start_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._frame is not None:
+            # the frame time includes the time spent waiting in clock.tick()
+            self._frame['frame'] = now - self._frame_start
+            self.history.append(self._frame)
+            self.records.append(self._frame)
+        self._frame = {}
+        self._frame_start = now
+
+    def begin_stage(self, name):
+        if not self.enabled or self._frame is None:
+            return
+        if name not in self.stage_names:
+            self.stage_names.append(name)
+        self._stage_starts[name] = time.perf_counter()
+
+    def end_stage(self, name):
+        if name not in self._stage_starts:
+            return
+        duration = time.perf_counter() - self._stage_starts.pop(name)
+        if self._frame is not None:
+            self._frame[name] = self._frame.get(name, 0) + duration
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self.begin_stage(name)
+        try:
+            yield
+        finally:
+            self.end_stage(name)
+
+    def get_fps(self):
+        if len(self.history) == 0:
+            return 0
+        mean_frame_time = sum(frame['frame'] for frame in self.history) / len(self.history)
+        return 1 / mean_frame_time if mean_frame_time > 0 else 0
+
+    def get_stage_means(self):
+        if len(self.history) == 0:
+            return {}
+        return {name: sum(frame.get(name, 0) for frame in self.history) / len(self.history)
+                for name in self.stage_names}
+
+    def get_text(self):
+        lines = ["Profiling:", f"FPS: {self.get_fps():.1f}"]
+        for name, mean_time in self.get_stage_means().items():
+            lines.append(f"- {name}: {1000 * mean_time:.2f} ms")
+        return lines
+
+    def save_csv(self, filename):
+        columns = self.stage_names + ['frame']
+        with open(filename, 'w', newline='') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(['index'] + [f"{column}_ms" for column in columns])
+            for index, frame in enumerate(self.records):
+                writer.writerow([index] + [f"{1000 * frame.get(column, 0):.4f}" for column in columns])
@@ -0,0 +1,92 @@
+import numpy as np
+
+from escher_maker.core import move_points
+
+SPHERE_RADIUS = 3
+
+
+class RadialLookup(object):
+    """
+    - Precomputed radial scaling of the spherical projection.
+    - The projection maps a point at distance r from the center to distance
+      `SPHERE_RADIUS * (1 - c ** -r)` with `c = SPHERE_RADIUS / (SPHERE_RADIUS - 1)`,
+      so it only depends on r and can be interpolated from a table instead of computing a power per point.
+    """
+
+    def __init__(self, max_norm=40, nr_of_samples=8192):
+        self.c = SPHERE_RADIUS / (SPHERE_RADIUS - 1)
+        self.max_norm = max_norm
+        self.norms = np.linspace(0, max_norm, nr_of_samples)
+        self.scalings = self.get_exact_scaling(self.norms)
+
+    def get_exact_scaling(self, norm):
+        norm = np.asarray(norm, dtype=float)
+        scaling = np.full(norm.shape, SPHERE_RADIUS * np.log(self.c))  # limit for norm -> 0
+        sel = norm > 0
+        scaling[sel] = SPHERE_RADIUS * (1 - np.power(self.c, -norm[sel])) / norm[sel]
+        return scaling
+
+    def get_scaling(self, norm):
+        scaling = np.interp(norm, self.norms, self.scalings)
+        # points far outside the table are already on the rim of the sphere
+        far = norm > self.max_norm
+        if np.any(far):
+            scaling[far] = SPHERE_RADIUS / norm[far]
+        return scaling
+
+
+SPHERICAL_LOOKUP = RadialLookup()
+
+
+def spherical_transform(pos):
+    norm = np.sqrt(pos[..., 0] ** 2 + pos[..., 1] ** 2)
+    pos *= SPHERICAL_LOOKUP.get_scaling(norm)[..., np.newaxis]
+    return pos
+
+
+def inverse_spherical_transform(pos):
+    # points on or outside the rim of the sphere are at infinity, they are set to nan
+    pos = np.array(pos, dtype=float)
+    norm = np.sqrt(pos[..., 0] ** 2 + pos[..., 1] ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        norm_pattern = -np.log(1 - norm / SPHERE_RADIUS) / np.log(SPHERICAL_LOOKUP.c)
+        scaling = np.where(norm > 0, norm_pattern / norm, 1 / (SPHERE_RADIUS * np.log(SPHERICAL_LOOKUP.c)))
+    scaling[norm >= SPHERE_RADIUS] = np.nan
+    pos *= scaling[..., np.newaxis]
+    return pos
+
+
+def get_pixels_per_unit(draw_settings):
+    # largest scale on screen, the spherical projection is largest in the center
+    if draw_settings['spherical']:
+        return draw_settings['shape_radius'] * SPHERICAL_LOOKUP.scalings[0]
+    return draw_settings['shape_radius']
+
+
+def pattern_pos_to_screen_pos(pos, draw_settings):
+    single_dim = pos.ndim == 1
+    if single_dim:
+        pos = np.array([pos])
+
+    pos_moved = pos.astype(float)
+    if draw_settings['spherical']:
+        pos_moved = spherical_transform(pos_moved)
+
+    pos_moved = move_points(pos_moved, [['scale', [draw_settings['shape_radius'], -draw_settings['shape_radius']]],
+                                        ['translate', [draw_settings['screen_size'][0] // 2,
+                                                       draw_settings['screen_size'][1] // 2]],  # center on screen
+                                        ])
+    if single_dim:
+        pos_moved = pos_moved[0]
+    return pos_moved
+
+
+def screen_pos_to_pattern_pos(pos, draw_settings):
+    pos = move_points(pos, [['translate', np.array([-draw_settings['screen_size'][0] // 2,
+                                                    -draw_settings['screen_size'][1] // 2], dtype=np.float32)],
+                            ['scale', np.array([1 / draw_settings['shape_radius'],
+                                                -1 / draw_settings['shape_radius']], dtype=np.float32)]
+                            ])
+    if draw_settings['spherical']:
+        pos = inverse_spherical_transform(pos)
+    return pos
@@ -0,0 +1,338 @@
+import argparse
+import itertools
+import struct
+import zlib
+
+import numpy as np
+
+from escher_maker.core import Tile, make_pattern, move_points, get_tile_color, get_tile_arrays
+from escher_maker.projection import get_pixels_per_unit, screen_pos_to_pattern_pos
+from escher_maker.serialization import load_pattern
+
+
+class PngWriter(object):
+    """
+    - Writes an 8-bit RGB PNG file band by band, so the full image never has to be in memory.
+    - `filename` can also be a binary file object, e.g. io.BytesIO, it is not closed by the writer.
+    - **Usage**
+        - `with PngWriter(filename, width, height) as writer: writer.write_rows(band)` with `band` a uint8
+          array of shape (rows, width, 3), called until all rows are written.
+    """
+
+    def __init__(self, filename, width, height, compression_level=6):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._owns_file = not hasattr(filename, 'write')
+        self._file = open(filename, 'wb') if self._owns_file else filename
+        self._compressor = zlib.compressobj(compression_level)
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        # width, height, bit depth 8, color type 2 (RGB), compression, filter and interlace method 0
+        self._write_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # an exception while writing the rows is more useful than the missing rows it causes
+        self.close(check_rows=exc_type is None)
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    def write_rows(self, rows):
+        rows = np.ascontiguousarray(rows, dtype=np.uint8)
+        if rows.shape[1:] != (self.width, 3):
+            raise ValueError(f"Rows of shape {rows.shape[1:]} do not match the image width {self.width}")
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError(f"More than {self.height} rows written")
+
+        # every row starts with filter type 0 (no filter)
+        scanlines = np.zeros((len(rows), 1 + 3 * self.width), dtype=np.uint8)
+        scanlines[:, 1:] = rows.reshape(len(rows), -1)
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._write_chunk(b'IDAT', data)
+        self.rows_written += len(rows)
+
+    def close(self, check_rows=True):
+        if self._compressor is None:
+            return
+        self._write_chunk(b'IDAT', self._compressor.flush())
+        self._write_chunk(b'IEND', b'')
+        self._compressor = None
+        if self._owns_file:
+            self._file.close()
+        if check_rows and self.rows_written != self.height:
+            raise RuntimeError(f"Only {self.rows_written} of {self.height} rows written")
+
+
+def fill_polygon(band, points, color, y_offset=0):
+    # Scanline fill with the even-odd rule, a pixel is filled when its center is inside the polygon.
+    # points are in image coordinates, band contains the image rows y_offset until y_offset + len(band)
+    height, width = band.shape[:2]
+    low = points.min(axis=0)
+    high = points.max(axis=0)
+    row_start = max(int(np.ceil(low[1] - 0.5)) - y_offset, 0)
+    row_end = min(int(np.ceil(high[1] - 0.5)) - y_offset, height)
+    col_start = max(int(np.ceil(low[0] - 0.5)), 0)
+    col_end = min(int(np.ceil(high[0] - 0.5)), width)
+    if row_start >= row_end or col_start >= col_end:
+        return
+
+    y0 = points[:, 1]
+    y1 = np.roll(points[:, 1], -1)
+    x0 = points[:, 0]
+    x1 = np.roll(points[:, 0], -1)
+    row_centers = (np.arange(row_start, row_end) + y_offset + 0.5)[:, np.newaxis]
+
+    # crossings of every row with every edge
+    crossing = (y0 <= row_centers) != (y1 <= row_centers)
+    rows, edges = np.nonzero(crossing)
+    x_crossing = x0[edges] + (row_centers[rows, 0] - y0[edges]) * (x1[edges] - x0[edges]) / (y1[edges] - y0[edges])
+    cols = np.clip(np.ceil(x_crossing - 0.5).astype(int), col_start, col_end) - col_start
+
+    # every crossing toggles inside/outside for the pixels to the right of it
+    toggles = np.zeros((row_end - row_start, col_end - col_start + 1), dtype=np.int32)
+    np.add.at(toggles, (rows, cols), 1)
+    inside = np.cumsum(toggles[:, :-1], axis=1) % 2 == 1
+
+    band[row_start:row_end, col_start:col_end][inside] = color
+
+
+def pattern_pos_to_image_pos(pos, draw_settings):
+    return move_points(pos, [['scale', [draw_settings['shape_radius'], -draw_settings['shape_radius']]],
+                             ['translate', [draw_settings['screen_size'][0] // 2,
+                                            draw_settings['screen_size'][1] // 2]]])
+
+
+def render_pattern_bands(pattern, draw_settings, band_height=256):
+    """
+    - Yields the image of the pattern as uint8 RGB bands of `band_height` rows.
+    - Only the tiles that overlap with a band are transformed and filled, so memory use depends on the band size
+      and not on the image size.
+    - The same buffer is yielded for every band, as a view of its first rows, copy a band to keep it.
+    """
+    width, height = draw_settings['screen_size']
+    background_color = draw_settings.get('background_color', (255, 255, 255))
+    shape_points = pattern.shape.get_coordinates(smoothed_curves=draw_settings['smoothed_curves'],
+                                                 pixels_per_unit=get_pixels_per_unit(draw_settings))
+    shape_reach = np.max(np.linalg.norm(shape_points, axis=1)) * draw_settings['shape_radius'] + 1
+
+    tile_centers = pattern_pos_to_image_pos(np.array([tile.pos for tile in pattern.tiles], dtype=float),
+                                            draw_settings)
+    tile_colors = np.array([get_tile_color(tile, draw_settings) for tile in pattern.tiles]).astype(np.uint8)
+    on_image = ((tile_centers[:, 0] + shape_reach >= 0) & (tile_centers[:, 0] - shape_reach <= width) &
+                (tile_centers[:, 1] + shape_reach >= 0) & (tile_centers[:, 1] - shape_reach <= height))
+
+    band = np.empty((band_height, width, 3), dtype=np.uint8)
+    for y_offset in range(0, height, band_height):
+        rows = min(band_height, height - y_offset)
+        band[:rows] = background_color
+        in_band = np.flatnonzero(on_image &
+                                 (tile_centers[:, 1] + shape_reach >= y_offset) &
+                                 (tile_centers[:, 1] - shape_reach <= y_offset + rows))
+        for index in in_band:
+            points = pattern_pos_to_image_pos(pattern.tiles[index].move_coordinates(shape_points), draw_settings)
+            fill_polygon(band[:rows], points, tile_colors[index], y_offset=y_offset)
+        yield band[:rows]
+
+
+def render_pattern_png(pattern, filename, draw_settings, band_height=256):
+    width, height = draw_settings['screen_size']
+    with PngWriter(filename, width, height) as writer:
+        for band in render_pattern_bands(pattern, draw_settings, band_height=band_height):
+            writer.write_rows(band)
+
+
+class TilingLattice(object):
+    """
+    - Periodic structure of a pattern, used to find the tile at any position without generating the tiles there.
+    - The tiles with the same orientation as the prototype tile form a lattice of translations. Every position is
+      moved into the fundamental cell of this lattice, where it can only be in one of a few nearby tiles.
+    - Whether a position is inside a tile is looked up in a rasterized mask of the shape.
+    """
+
+    def __init__(self, pattern, shape_points, mask_resolution=2048, eps=1e-5):
+        self.basis = self.get_basis(pattern.tiles, eps)
+        positions, rotations, mirrors = get_tile_arrays(pattern.tiles)
+        rotations = rotations % (2 * np.pi)
+        self.inverse_basis = np.linalg.inv(self.basis)
+
+        # the shape as a mask in its own coordinates
+        self.reach = np.max(np.linalg.norm(shape_points, axis=1)) * (1 + 1e-3)
+        self.mask_resolution = mask_resolution
+        self.mask = np.zeros((mask_resolution, mask_resolution), dtype=np.uint8)
+        fill_polygon(self.mask, self._to_mask_pos(shape_points), 1)
+        # grow the mask by one cell to prevent gaps between neighbouring tiles, the first tile found is used
+        grown = self.mask.copy()
+        grown[1:] |= self.mask[:-1]
+        grown[:-1] |= self.mask[1:]
+        grown[:, 1:] |= self.mask[:, :-1]
+        grown[:, :-1] |= self.mask[:, 1:]
+        self.mask = grown
+
+        # one tile per orientation, moved into the fundamental cell of the lattice
+        motif = {}
+        for position, rotation, mirror in zip(positions, rotations, mirrors):
+            orientation = (round(rotation, 5) % round(2 * np.pi, 5), int(mirror))
+            if orientation not in motif:
+                coefficients = self.inverse_basis.dot(position)
+                motif[orientation] = (self.basis.dot(coefficients - np.floor(coefficients)), rotation, mirror)
+
+        # all translated copies that can overlap with the fundamental cell
+        cell_corners = np.array([[0, 0], [1, 0], [0, 1], [1, 1]]).dot(self.basis.T)
+        cell_center = cell_corners.mean(axis=0)
+        cell_radius = np.max(np.linalg.norm(cell_corners - cell_center, axis=1))
+        nr_of_shifts = int(np.ceil((self.reach + cell_radius) / np.min(np.linalg.norm(self.basis, axis=0)))) + 1
+        self.candidates = []
+        for position, rotation, mirror in motif.values():
+            for shift in itertools.product(range(-nr_of_shifts, nr_of_shifts + 1), repeat=2):
+                center = position + self.basis.dot(shift)
+                if np.linalg.norm(center - cell_center) < self.reach + cell_radius:
+                    self.candidates.append(Tile(pos=center, rot=rotation, mirror=int(mirror)))
+
+    @staticmethod
+    def get_basis(tiles, eps=1e-5):
+        # the shortest translations between the tiles with the orientation of the prototype tile, as columns
+        positions, rotations, mirrors = get_tile_arrays(tiles)
+        rotations = rotations % (2 * np.pi)
+        translations = positions[(mirrors > 0) & ((rotations < eps) | (rotations > 2 * np.pi - eps))]
+        translations = translations[np.linalg.norm(translations, axis=1) > eps]
+        if len(translations) == 0:
+            raise RuntimeError("Pattern has too few tiles to find its translations")
+        translations = translations[np.argsort(np.linalg.norm(translations, axis=1))]
+        v1 = translations[0]
+        for v2 in translations[1:]:
+            if abs(v1[0] * v2[1] - v1[1] * v2[0]) > eps * np.linalg.norm(v1) * np.linalg.norm(v2):
+                break
+        else:
+            raise RuntimeError("Pattern has too few tiles to find its translations")
+
+        # Lagrange-Gauss reduction to get the shortest basis
+        while True:
+            if np.linalg.norm(v2) < np.linalg.norm(v1):
+                v1, v2 = v2, v1
+            m = np.round(v1.dot(v2) / v1.dot(v1))
+            if m == 0:
+                break
+            v2 = v2 - m * v1
+        return np.array([v1, v2]).T
+
+    def _to_mask_pos(self, pos):
+        return (pos + self.reach) / (2 * self.reach) * self.mask_resolution
+
+    def get_tiles(self, pos):
+        """
+        - Returns for every position the index in `self.candidates` of the tile it is in, or -1.
+        - Positions with nan values (outside the sphere) are in no tile.
+        """
+        tile_indexes = np.full(len(pos), -1)
+        valid = np.all(np.isfinite(pos), axis=1)
+        coefficients = pos[valid].dot(self.inverse_basis.T)
+        reduced_pos = pos[valid] - np.floor(coefficients).dot(self.basis.T)
+        valid_indexes = np.flatnonzero(valid)
+
+        for index_candidate, tile in enumerate(self.candidates):
+            todo = tile_indexes[valid_indexes] < 0
+            if not np.any(todo):
+                break
+            local_pos = reduced_pos[todo] - tile.pos
+            # inverse of Tile.move_coordinates: rotate back, then mirror
+            c, s = np.cos(tile.rot), np.sin(tile.rot)
+            local_pos = np.stack([tile.mirror * (c * local_pos[:, 0] - s * local_pos[:, 1]),
+                                  s * local_pos[:, 0] + c * local_pos[:, 1]], axis=1)
+            mask_pos = np.floor(self._to_mask_pos(local_pos)).astype(int)
+            in_range = np.all((mask_pos >= 0) & (mask_pos < self.mask_resolution), axis=1)
+            inside = np.zeros(len(local_pos), dtype=bool)
+            inside[in_range] = self.mask[mask_pos[in_range, 1], mask_pos[in_range, 0]] > 0
+            tile_indexes[valid_indexes[np.flatnonzero(todo)[inside]]] = index_candidate
+        return tile_indexes
+
+
+def extend_for_lattice(pattern, max_distance=4.5, step=1.5, max_max_distance=12):
+    """
+    - Adds tiles to the pattern until TilingLattice can find its translations, starting at `max_distance`.
+    - Some patterns need tiles up to a distance of 7 before two tiles have the orientation of the prototype tile,
+      beyond `max_max_distance` the RuntimeError of TilingLattice is raised.
+    """
+    while True:
+        pattern.extend(max_distance)
+        try:
+            TilingLattice.get_basis(pattern.tiles)
+            return
+        except RuntimeError:
+            if max_distance >= max_max_distance:
+                raise
+            max_distance = min(max_distance + step, max_max_distance)
+
+
+def render_projected_bands(pattern, draw_settings, band_height=256, lattice=None):
+    """
+    - Yields the image of the pattern as uint8 RGB bands, by mapping every pixel back to the pattern.
+    - Works for the flat and the spherical projection, and the cost depends on the number of pixels only,
+      not on the number of tiles near the rim of the sphere.
+    """
+    width, height = draw_settings['screen_size']
+    background_color = draw_settings.get('background_color', (255, 255, 255))
+    if lattice is None:
+        shape_points = pattern.shape.get_coordinates(smoothed_curves=draw_settings['smoothed_curves'],
+                                                     pixels_per_unit=get_pixels_per_unit(draw_settings))
+        lattice = TilingLattice(pattern, shape_points)
+    colors = np.array([get_tile_color(tile, draw_settings) for tile in lattice.candidates] + [background_color])
+    colors = colors.astype(np.uint8)
+
+    x = np.arange(width) + 0.5
+    for y_offset in range(0, height, band_height):
+        rows = min(band_height, height - y_offset)
+        y = np.arange(y_offset, y_offset + rows) + 0.5
+        pixel_pos = np.stack(np.meshgrid(x, y), axis=-1).reshape(-1, 2)
+        tile_indexes = lattice.get_tiles(screen_pos_to_pattern_pos(pixel_pos, draw_settings))
+        yield colors[tile_indexes].reshape(rows, width, 3)  # index -1 is the background color
+
+
+def render_projected_png(pattern, filename, draw_settings, band_height=256):
+    width, height = draw_settings['screen_size']
+    with PngWriter(filename, width, height) as writer:
+        for band in render_projected_bands(pattern, draw_settings, band_height=band_height):
+            writer.write_rows(band)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render an Escher pattern to a PNG file without a display.")
+    parser.add_argument('filename', help="output PNG file")
+    parser.add_argument('--combination', default='0,1,2', help="comma separated combination, e.g. 0,1,2")
+    parser.add_argument('--pattern', help="JSON file of a saved pattern, instead of --combination")
+    parser.add_argument('--size', type=int, nargs=2, default=[2000, 2000], help="image width and height")
+    parser.add_argument('--shape-radius', type=float, default=100, help="size of a tile in pixels")
+    parser.add_argument('--band-height', type=int, default=256, help="number of image rows rendered at once")
+    parser.add_argument('--straight', action='store_true', help="straight instead of smoothed curves")
+    parser.add_argument('--spherical', action='store_true', help="spherical instead of flat projection")
+    args = parser.parse_args()
+
+    draw_settings = {
+        'shape_radius': args.shape_radius,
+        'screen_size': args.size,
+        'smoothed_curves': not args.straight,
+        'spherical': args.spherical,
+        'tile_color': np.array([0, 0, 255.0]),
+        'tile_flipped_color': np.array([0, 255.0, 0]),
+    }
+    if args.pattern is not None:
+        pattern = load_pattern(args.pattern)
+    else:
+        pattern = make_pattern([int(side) for side in args.combination.split(',')])
+    if args.spherical:
+        # the tiles are found through the periodicity of the pattern, so only the tiles around the center are needed
+        extend_for_lattice(pattern)
+        render_projected_png(pattern, args.filename, draw_settings, band_height=args.band_height)
+    else:
+        pattern.extend(np.ceil(np.max(args.size) / args.shape_radius) * 1.5)
+        render_pattern_png(pattern, args.filename, draw_settings, band_height=args.band_height)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from escher_maker.core import (Link, Node, Pattern, Segment, Shape, Tile, create_shape, get_all_patterns,
+                               rotation_matrix)
+
+
+class EncodeFromNumpy(json.JSONEncoder):
+    """
+    - Serializes python/Numpy objects via customizing json encoder.
+    - **Usage**
+        - `json.dumps(python_dict, cls=EncodeFromNumpy)` to get json string.
+        - `json.dump(*args, cls=EncodeFromNumpy)` to create a file.json.
+    """
+
+    def default(self, obj):
+        import numpy
+        if isinstance(obj, numpy.ndarray):
+            return {
+                "_kind_": "ndarray",
+                "_value_": obj.tolist()
+            }
+        if isinstance(obj, numpy.integer):
+            return int(obj)
+        elif isinstance(obj, numpy.floating):
+            return float(obj)
+        elif isinstance(obj, range):
+            value = list(obj)
+            return {
+                "_kind_": "range",
+                "_value_": [value[0], value[-1] + 1]
+            }
+        return super(EncodeFromNumpy, self).default(obj)
+
+
+class DecodeToNumpy(json.JSONDecoder):
+    """
+    - Deserilizes JSON object to Python/Numpy's objects.
+    - **Usage**
+        - `json.loads(json_string,cls=DecodeToNumpy)` from string, use `json.load()` for file.
+    """
+
+    def __init__(self, *args, **kwargs):
+        json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
+
+    def object_hook(self, obj):
+        import numpy
+        if '_kind_' not in obj:
+            return obj
+        kind = obj['_kind_']
+        if kind == 'ndarray':
+            return numpy.array(obj['_value_'])
+        elif kind == 'range':
+            value = obj['_value_']
+            return range(value[0], value[-1])
+        return obj
+
+
+def save_pattern(pattern, filename):
+    # Based on:
+    # https://cattrs.readthedocs.io/en/latest/readme.html
+    # https://stackabuse.com/reading-and-writing-json-to-a-file-in-python/
+    # https://stackoverflow.com/questions/26646362/numpy-array-is-not-json-serializable
+    import cattr
+    with open(filename, 'w') as outfile:
+        json.dump(cattr.unstructure(pattern), outfile, cls=EncodeFromNumpy)
+
+
+def load_pattern(filename):
+    import cattr
+    with open(filename) as json_file:
+        return restore_shared_nodes(cattr.structure(json.load(json_file, cls=DecodeToNumpy), Pattern))
+
+
+def restore_shared_nodes(pattern):
+    """
+    - The JSON written by save_pattern has a copy of every node and segment where it is used, while a shape shares
+      the last node of a segment with the next segment and the segments of its links with its own segments.
+    - Replaces the copies by the shared objects again, so moving a node also moves its linked nodes.
+    """
+    segments = pattern.shape.segments
+    for index_segment, segment in enumerate(segments):
+        segments[(index_segment + 1) % len(segments)].nodes[0] = segment.nodes[-1]
+
+    def get_key(segment):
+        return (segment.angle, segment.dist_for_center,
+                tuple(np.round(np.array([node.pos for node in segment.nodes], dtype=float), 9).ravel()))
+
+    segments_by_key = {get_key(segment): segment for segment in segments}
+    for link in pattern.shape.links:
+        link.segment_source = segments_by_key[get_key(link.segment_source)]
+        link.segment_linked = segments_by_key[get_key(link.segment_linked)]
+    return pattern
+
+
+def pattern_from_web_json(objects):
+    """
+    - Converts a pattern saved by the web front end (javascript/escher_save_and_load.js) to a Pattern.
+    - The web format is a list of objects with a "type", the first one is the pattern. References to other objects are
+      ["Object_ref", index] and vectors are ["P5vector", [x, y]], so objects shared by reference stay shared.
+    - The coordinates are the same as in python, only Segment.dist_to_center is called dist_for_center here.
+    """
+    converted = {}
+
+    def resolve(value):
+        if isinstance(value, list):
+            if len(value) == 2 and value[0] == 'Object_ref':
+                return convert(value[1])
+            if len(value) == 2 and value[0] == 'P5vector':
+                return np.array(value[1], dtype=float)
+            return [resolve(element) for element in value]
+        return value
+
+    def convert(index):
+        if index in converted:
+            return converted[index]
+        obj = objects[index]
+        if not isinstance(obj, dict):
+            raise ValueError(f"Object {index} is not a JSON object")
+        kind = obj.get('type')
+        if kind == 'Node':
+            result = Node(pos=resolve(obj['pos']), movable=obj.get('movable', True))
+        elif kind == 'Segment':
+            result = Segment(nodes=resolve(obj['nodes']), angle=obj['angle'], dist_for_center=obj['dist_to_center'])
+        elif kind == 'Link':
+            result = Link(segment_source=resolve(obj['segment_source']), segment_linked=resolve(obj['segment_linked']),
+                          flip_x=obj['flip_x'], flip_y=obj['flip_y'])
+        elif kind == 'Shape':
+            result = Shape(segments=resolve(obj['segments']), links=resolve(obj['links']))
+        elif kind == 'Tile':
+            result = Tile(pos=resolve(obj['pos']), rot=obj['rot'], mirror=obj['mirror'])
+        elif kind == 'Pattern':
+            result = Pattern(tiles=resolve(obj['tiles']), combination=list(obj['combination']),
+                             shape=resolve(obj['shape']))
+        else:
+            raise ValueError(f"Object {index} has unknown type {kind}")
+        converted[index] = result
+        return result
+
+    pattern = convert(0)
+    if not isinstance(pattern, Pattern):
+        raise ValueError("The first object is not a pattern")
+    return pattern
+
+
+def pattern_from_nodes(combination, nodes=None):
+    # a pattern from its combination and the positions of all nodes of the shape, in the order of Shape.get_nodes()
+    shape = create_shape(combination=combination)
+    if nodes is None:
+        return Pattern(tiles=[Tile()], combination=list(combination), shape=shape)
+    shape_nodes = shape.get_nodes()
+    nodes = np.asarray(nodes, dtype=float)
+    if nodes.shape != (len(shape_nodes), 2):
+        raise ValueError(f"Expected {len(shape_nodes)} nodes for combination {combination}, got {len(nodes)}")
+    for node, pos in zip(shape_nodes, nodes):
+        node.pos = pos.copy()
+    return Pattern(tiles=[Tile()], combination=list(combination), shape=shape)
+
+
+def get_relative_combination(combination):
+    # the side each side is linked to, counted from the side itself, so it does not change when the combination is
+    # rotated. Negative values keep the encoding of sides linked to the flipped shape.
+    nr_sides = len(combination)
+    return [(side - index_side) % nr_sides if side >= 0 else -((-side - 1 - index_side) % nr_sides) - 1
+            for index_side, side in enumerate(combination)]
+
+
+def get_pattern_hash(pattern, decimals=9):
+    """
+    - Identifies a pattern by its prototype shape, the tiles follow from the shape and the combination.
+    - Rotating the combination gives the same pattern when the shape is rotated along, so the hash is the same for
+      all rotations: every side is tried as the first side, with the nodes rotated such that this side is at the
+      angle of the first side, and the smallest description is hashed.
+    - The nodes are taken per side from the segments, so the hash does not depend on the order of Shape.get_nodes()
+      or on the number of nodes of the sides.
+    """
+    segments = pattern.shape.segments
+    nr_sides = len(pattern.combination)
+    segments_per_side = len(segments) // nr_sides
+    relative_combination = get_relative_combination(pattern.combination)
+    sides_pos = [np.array([node.pos
+                           for segment in segments[index_side * segments_per_side:(index_side + 1) * segments_per_side]
+                           for node in segment.nodes[:-1]], dtype=float)
+                 for index_side in range(nr_sides)]
+
+    descriptions = []
+    for first_side in range(nr_sides):
+        rotation = rotation_matrix(-segments[first_side * segments_per_side].angle)
+        sides = []
+        for index_side in range(nr_sides):
+            index = (first_side + index_side) % nr_sides
+            # + 0.0 turns -0.0 into 0.0
+            side_pos = np.round(sides_pos[index].dot(rotation.T), decimals) + 0.0
+            sides.append([relative_combination[index], side_pos.tolist()])
+        descriptions.append(json.dumps(sides))
+    return hashlib.sha256(min(descriptions).encode()).hexdigest()
+
+
+def read_pattern_file(filename):
+    # a pattern saved by save_pattern or by the web front end
+    with open(filename) as json_file:
+        data = json.load(json_file, cls=DecodeToNumpy)
+    if isinstance(data, dict) and 'pattern' in data:
+        return pattern_from_web_json(data['pattern'])
+    if isinstance(data, list):
+        return pattern_from_web_json(data)
+    if not isinstance(data, dict) or not {'tiles', 'combination', 'shape'} <= data.keys():
+        raise ValueError(f"{filename} is not a pattern")
+    import cattr
+    return restore_shared_nodes(cattr.structure(data, Pattern))
+
+
+def index_pattern_directory(directory):
+    """
+    - Reads all JSON files in the directory and groups them by pattern hash, see `get_pattern_hash`.
+    - Returns a dict from hash to the list of filenames with that pattern, so files with the same hash are duplicates.
+    - Files that are not a pattern are skipped.
+    """
+    from cattrs.errors import BaseValidationError
+    index = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(('.json', '.txt')):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            pattern = read_pattern_file(path)
+        except (ValueError, KeyError, TypeError, IndexError, AttributeError, BaseValidationError):
+            continue
+        index.setdefault(get_pattern_hash(pattern), []).append(path)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Save all valid patterns with the given numbers of sides as JSON.")
+    parser.add_argument('directory', help="output directory")
+    parser.add_argument('--nr-sides', type=int, nargs='+', default=[3, 4, 6])
+    parser.add_argument('--max-distance', type=float, default=3.5, help="size of the tiling, in tile heights")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    for nr_sides in args.nr_sides:
+        for index_pattern, pattern in enumerate(get_all_patterns(nr_sides, max_distance=args.max_distance)):
+            filename = os.path.join(args.directory, f"pattern_{nr_sides}_{index_pattern + 1}.json")
+            save_pattern(pattern, filename)
+            print(f"{filename}: combination {pattern.combination}, {len(pattern.tiles)} tiles")
+
+
+def main_index():
+    parser = argparse.ArgumentParser(description="Find duplicate patterns in a directory of JSON files.")
+    parser.add_argument('directory')
+    parser.add_argument('--all', action='store_true', help="also list the patterns without duplicates")
+    args = parser.parse_args()
+
+    index = index_pattern_directory(args.directory)
+    nr_duplicates = 0
+    for pattern_hash, filenames in index.items():
+        if len(filenames) > 1 or args.all:
+            print(f"{pattern_hash[:16]}: {', '.join(filenames)}")
+        nr_duplicates += len(filenames) - 1
+    print(f"{sum(len(filenames) for filenames in index.values())} patterns, {len(index)} unique, "
+          f"{nr_duplicates} duplicates")
+
+
+if __name__ == "__main__":
+    main()
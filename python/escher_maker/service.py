@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from escher_maker.raster import extend_for_lattice, render_pattern_png, render_projected_png
+from escher_maker.serialization import pattern_from_nodes, pattern_from_web_json
+from escher_maker.svg import render_pattern_svg
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+MAX_IMAGE_SIZE = 8192
+MAX_TILES_ACROSS = 64
+MAX_REQUEST_SIZE = 32 * 1024 * 1024
+
+
+class RenderCache(object):
+    """
+    - Least recently used cache of rendered images in memory, optionally backed by a directory on disk so renders
+      survive a restart of the service.
+    - Safe to use from multiple threads.
+    """
+
+    def __init__(self, max_entries=256, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.directory is None or not os.path.exists(self._get_filename(key)):
+            return None
+        with open(self._get_filename(key), 'rb') as infile:
+            data = infile.read()
+        self._add(key, data)
+        return data
+
+    def put(self, key, data):
+        self._add(key, data)
+        if self.directory is not None:
+            # write to a temporary file first, so other threads and processes never read a partial file
+            temporary_filename = f"{self._get_filename(key)}.{threading.get_ident()}.tmp"
+            with open(temporary_filename, 'wb') as outfile:
+                outfile.write(data)
+            os.replace(temporary_filename, self._get_filename(key))
+
+    def _add(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_filename(self, key):
+        return os.path.join(self.directory, key)
+
+
+class RenderService(object):
+    """
+    - Renders patterns to PNG or SVG in a thread pool, with a cache keyed by the pattern and the render settings.
+    - Identical requests that arrive while the first one is still rendering wait for that render.
+    - **Usage**
+        - `content_type, data, cache_hit = service.render(request)` with `request` the decoded JSON of a request,
+          see `parse_request`.
+    """
+
+    def __init__(self, workers=4, cache=None):
+        self.cache = RenderCache() if cache is None else cache
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def render(self, request):
+        pattern, draw_settings, image_format = parse_request(request)
+        key = get_render_key(pattern, draw_settings, image_format)
+        data = self.cache.get(key)
+        if data is not None:
+            return CONTENT_TYPES[image_format], data, True
+
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._render, key, pattern, draw_settings, image_format)
+                self._pending[key] = future
+        return CONTENT_TYPES[image_format], future.result(), False
+
+    def _render(self, key, pattern, draw_settings, image_format):
+        try:
+            data = render(pattern, draw_settings, image_format)
+            self.cache.put(key, data)
+            return data
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+def parse_request(request):
+    """
+    - `pattern`: a pattern saved by the web front end (list of objects), or {"combination": [...], "nodes": [...]}.
+      The combination and nodes can also be given at the top level, without nodes the default shape is used.
+    - `settings`: the render settings, the settings saved by the web front end can be used as they are.
+    - `format`: "png" (default) or "svg".
+    """
+    if not isinstance(request, dict):
+        raise ValueError("The request should be a JSON object")
+    pattern_data = request.get('pattern', request)
+    try:
+        if isinstance(pattern_data, list):
+            pattern = pattern_from_web_json(pattern_data)
+        elif isinstance(pattern_data, dict) and 'combination' in pattern_data:
+            check_combination(pattern_data['combination'])
+            pattern = pattern_from_nodes(pattern_data['combination'], pattern_data.get('nodes'))
+        else:
+            raise ValueError("The request has no pattern or combination")
+        check_combination(pattern.combination)
+        if len(pattern.shape.segments) != 2 * len(pattern.combination):
+            raise ValueError("The shape does not have two segments per side of the combination")
+    except ValueError:
+        raise
+    except Exception as error:
+        # the request comes from outside, any error in it is a bad request
+        raise ValueError(f"Invalid pattern: {error!r}") from error
+
+    image_format = request.get('format', 'png')
+    if image_format not in CONTENT_TYPES:
+        raise ValueError(f"Format {image_format} is not one of {list(CONTENT_TYPES)}")
+    return pattern, get_draw_settings(request.get('settings', {})), image_format
+
+
+def get_draw_settings(settings):
+    # draw settings from the settings of the web front end, plus the image width and height
+    if not isinstance(settings, dict):
+        raise ValueError("The settings should be a JSON object")
+    width = int(settings.get('width', 800))
+    height = int(settings.get('height', 800))
+    if not (0 < width <= MAX_IMAGE_SIZE and 0 < height <= MAX_IMAGE_SIZE):
+        raise ValueError(f"The image size should be between 1 and {MAX_IMAGE_SIZE} pixels")
+    shape_radius = float(settings.get('shape_radius', 100))
+    # the number of tiles grows with the square of the image size in tiles
+    min_shape_radius = max(width, height) / MAX_TILES_ACROSS
+    if not shape_radius >= min_shape_radius:
+        raise ValueError(f"shape_radius should be at least {min_shape_radius:g} pixels for this image size")
+    projection = settings.get('projection', 'Flat')
+    if projection not in ('Flat', 'Spherical'):
+        raise ValueError(f"Projection {projection} is not Flat or Spherical")
+    return {
+        'shape_radius': shape_radius,
+        'screen_size': [width, height],
+        'smoothed_curves': bool(settings.get('smoothed_curves', True)),
+        'spherical': projection == 'Spherical',
+        'borders': bool(settings.get('borders', False)),
+        'background_color': tuple(int(channel) for channel in settings.get('background_color', (255, 255, 255))),
+        'tile_color': np.array(settings.get('tile_color', [0, 0, 255]), dtype=float),
+        'tile_flipped_color': np.array(settings.get('tile_flipped_color', [0, 255, 0]), dtype=float),
+    }
+
+
+def check_combination(combination):
+    # only triangles, squares and hexagons tile the plane, and every side has to be linked back by its partner
+    if not isinstance(combination, (list, tuple)) or len(combination) not in (3, 4, 6):
+        raise ValueError("The combination should be a list of 3, 4 or 6 sides")
+    nr_sides = len(combination)
+    for index_side, side in enumerate(combination):
+        if not isinstance(side, (int, np.integer)) or isinstance(side, bool) or not -nr_sides <= side < nr_sides:
+            raise ValueError(f"Side {index_side} of the combination should be an integer from {-nr_sides} to "
+                             f"{nr_sides - 1}")
+        partner = side if side >= 0 else -side - 1
+        expected = index_side if side >= 0 else -index_side - 1
+        if combination[partner] != expected:
+            raise ValueError(f"Side {index_side} is linked to side {partner}, but side {partner} is not linked back")
+
+
+def get_render_key(pattern, draw_settings, image_format, decimals=9):
+    # get_pattern_hash is the same for rotated versions of a pattern, which render differently, so the key uses the
+    # exact combination and node positions
+    nodes_pos = np.round(np.array([node.pos for node in pattern.shape.get_nodes()], dtype=float), decimals) + 0.0
+    settings = {key: value.tolist() if isinstance(value, np.ndarray) else value
+                for key, value in draw_settings.items()}
+    content = json.dumps([[int(side) for side in pattern.combination], nodes_pos.tolist(), settings, image_format],
+                         sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def render(pattern, draw_settings, image_format):
+    # the tiles needed to fill the image are added to the pattern, the spherical projection finds the tiles through
+    # the translations of the pattern and needs the tiles around the center only
+    if draw_settings['spherical'] and image_format == 'png':
+        extend_for_lattice(pattern)
+    else:
+        pattern.extend(np.ceil(np.max(draw_settings['screen_size']) / draw_settings['shape_radius']) * 1.5)
+    if image_format == 'svg':
+        return render_pattern_svg(pattern, draw_settings).encode()
+    buffer = io.BytesIO()
+    if draw_settings['spherical']:
+        render_projected_png(pattern, buffer, draw_settings)
+    else:
+        render_pattern_png(pattern, buffer, draw_settings)
+    return buffer.getvalue()
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    - `GET /health`: returns {"status": "ok"}.
+    - `POST /render`: renders the pattern in the JSON body, see `parse_request`. The X-Cache header tells if the
+      render came from the cache.
+    """
+
+    def do_OPTIONS(self):
+        # allows the web front end to post from another origin
+        self.send_response(204)
+        self._send_cors_headers()
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, 'application/json', json.dumps({'status': 'ok'}).encode())
+        else:
+            self._send_error(404, f"Unknown path {self.path}")
+
+    def do_POST(self):
+        if self.path != '/render':
+            self._send_error(404, f"Unknown path {self.path}")
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        if length > MAX_REQUEST_SIZE:
+            self._send_error(413, "Request too large")
+            return
+        try:
+            request = json.loads(self.rfile.read(length))
+            content_type, data, cache_hit = self.server.service.render(request)
+        except (ValueError, KeyError, TypeError, RuntimeError) as error:
+            self._send_error(400, str(error))
+            return
+        except Exception as error:
+            self._send_error(500, f"Render failed: {error!r}")
+            return
+        self._send(200, content_type, data, {'X-Cache': 'hit' if cache_hit else 'miss'})
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status, content_type, data, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self._send_cors_headers()
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        self._send(status, 'application/json', json.dumps({'error': message}).encode())
+
+    def _send_cors_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+
+
+def create_server(host='127.0.0.1', port=8765, workers=4, cache_entries=256, cache_directory=None, quiet=False):
+    server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.daemon_threads = True
+    server.service = RenderService(workers=workers,
+                                   cache=RenderCache(max_entries=cache_entries, directory=cache_directory))
+    server.quiet = quiet
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP service that renders patterns to PNG or SVG.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=4, help="number of renders at the same time")
+    parser.add_argument('--cache-entries', type=int, default=256, help="number of renders kept in memory")
+    parser.add_argument('--cache-dir', help="directory to keep renders on disk")
+    parser.add_argument('--quiet', action='store_true', help="do not log every request")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, workers=args.workers, cache_entries=args.cache_entries,
+                           cache_directory=args.cache_dir, quiet=args.quiet)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import numpy as np
+
+from escher_maker.core import get_tile_color, move_coordinates_all
+from escher_maker.projection import get_pixels_per_unit, pattern_pos_to_screen_pos
+
+
+def get_svg_color(color):
+    return 'rgb({},{},{})'.format(*(int(round(channel)) for channel in color))
+
+
+def render_pattern_svg(pattern, draw_settings):
+    """
+    - Returns the pattern as an SVG document, with one polygon per tile that is (partly) inside the image.
+    - Uses the same projection as the pygame front end, so it works for the flat and the spherical projection.
+    """
+    width, height = draw_settings['screen_size']
+    shape_points = pattern.shape.get_coordinates(smoothed_curves=draw_settings['smoothed_curves'],
+                                                 pixels_per_unit=get_pixels_per_unit(draw_settings))
+    tile_points = move_coordinates_all(pattern.tiles, shape_points)
+    tile_points = pattern_pos_to_screen_pos(tile_points.reshape(-1, 2), draw_settings).reshape(tile_points.shape)
+    low = tile_points.min(axis=1)
+    high = tile_points.max(axis=1)
+    # tiles outside the image or smaller than a pixel are left out
+    visible = ((high[:, 0] >= 0) & (low[:, 0] <= width) & (high[:, 1] >= 0) & (low[:, 1] <= height) &
+               (np.max(high - low, axis=1) >= 1))
+
+    stroke = ' stroke="rgb(255,255,255)" stroke-width="1"' if draw_settings.get('borders', False) else ''
+    lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}">',
+             f'<rect width="{width}" height="{height}" '
+             f'fill="{get_svg_color(draw_settings.get("background_color", (255, 255, 255)))}"/>']
+    for index in np.flatnonzero(visible):
+        points = ' '.join(f'{x:.2f},{y:.2f}' for x, y in tile_points[index])
+        color = get_svg_color(get_tile_color(pattern.tiles[index], draw_settings))
+        lines.append(f'<polygon points="{points}" fill="{color}"{stroke}/>')
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
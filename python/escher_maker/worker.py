@@ -0,0 +1,143 @@
+import multiprocessing
+import queue
+
+import numpy as np
+
+from escher_maker.core import Pattern, Tile, TilingGrower, create_shape, get_all_combinations
+
+
+class PatternCatalog(object):
+    """
+    - Generates the patterns for a number of nr_sides in a background process, so it does not compete with the UI
+      thread for the interpreter lock.
+    - Every pattern is available immediately with only its prototype tile, the other tiles are added while they are
+      generated. Patterns of combinations that turn out to be invalid are removed from the catalog.
+    - The patterns are only changed from the thread that calls `update`, the worker only sends messages.
+    - **Usage**
+        - `catalog.update()` once per frame, returns True when patterns changed.
+        - `catalog.prioritize(pattern)` to generate the tiles of the pattern that is shown first.
+        - `catalog.extend(pattern, max_distance)` to grow a pattern further, e.g. when zooming out.
+    """
+
+    def __init__(self, all_nr_sides, radius=1, max_distance=3.5, batch_size=10):
+        self.all_nr_sides = list(all_nr_sides)
+        self.radius = radius
+        self.max_distance = max_distance
+
+        self.patterns = {}
+        self.invalid_patterns = []
+        self._jobs = []
+        for nr_sides in self.all_nr_sides:
+            self.patterns[nr_sides] = []
+            for combination in get_all_combinations(nr_sides):
+                pattern = Pattern(tiles=[Tile()], combination=combination,
+                                  shape=create_shape(combination=combination, radius=radius))
+                self.patterns[nr_sides].append(pattern)
+                self._jobs.append(pattern)
+        self._max_distances = [max_distance] * len(self._jobs)
+
+        self._requests = multiprocessing.Queue()
+        self._messages = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        self._process = multiprocessing.Process(target=generate_tiles,
+                                                args=([pattern.combination for pattern in self._jobs],
+                                                      self._requests, self._messages, self._stop,
+                                                      radius, max_distance, batch_size),
+                                                daemon=True)
+        self._process.start()
+
+    def get_patterns(self, nr_sides):
+        return self.patterns[nr_sides]
+
+    def has_pattern(self, pattern):
+        return self._get_job_index(pattern) is not None
+
+    def prioritize(self, pattern):
+        index_job = self._get_job_index(pattern)
+        if index_job is not None:
+            self._requests.put(('prioritize', index_job))
+
+    def extend(self, pattern, max_distance):
+        index_job = self._get_job_index(pattern)
+        if index_job is None or max_distance <= self._max_distances[index_job]:
+            return
+        self._max_distances[index_job] = max_distance
+        self._requests.put(('extend', index_job, max_distance))
+
+    def _get_job_index(self, pattern):
+        for index_job, job in enumerate(self._jobs):
+            if job is pattern:
+                return index_job
+        return None
+
+    def stop(self):
+        self._stop.set()
+        self._process.join(timeout=1)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def update(self):
+        changed = False
+        while True:
+            try:
+                index_job, kind, tiles = self._messages.get_nowait()
+            except queue.Empty:
+                return changed
+            changed = True
+            pattern = self._jobs[index_job]
+            if kind == 'tiles':
+                pattern.tiles.extend(Tile(pos=np.array(pos), rot=rot, mirror=mirror) for pos, rot, mirror in tiles)
+            elif kind == 'invalid':
+                self.invalid_patterns.append(pattern)
+                for patterns in self.patterns.values():
+                    if pattern in patterns:
+                        patterns.remove(pattern)
+
+
+def generate_tiles(combinations, requests, messages, stop, radius, max_distance, batch_size):
+    # runs in the worker process, tiles are sent as plain tuples to keep the messages small
+    growers = [TilingGrower(combination, radius=radius) for combination in combinations]
+    max_distances = [max_distance] * len(combinations)
+    todo = list(range(len(combinations)))
+    while not stop.is_set():
+        try:
+            # wait for new requests when all jobs are done
+            request = requests.get(block=len(todo) == 0, timeout=0.1)
+            while True:
+                index_job = request[1]
+                if request[0] == 'extend':
+                    max_distances[index_job] = request[2]
+                if index_job in todo:
+                    todo.remove(index_job)
+                    todo.insert(0, index_job)
+                elif request[0] == 'extend':
+                    todo.insert(0, index_job)
+                request = requests.get_nowait()
+        except queue.Empty:
+            pass
+        if len(todo) == 0 or growers[todo[0]] is None:
+            if len(todo) > 0:
+                todo.pop(0)  # invalid pattern
+            continue
+        index_job = todo[0]
+
+        tiles = []
+        try:
+            for tile in growers[index_job].grow(max_distances[index_job]):
+                if stop.is_set():
+                    return
+                tiles.append((tuple(tile.pos), tile.rot, tile.mirror))
+                if len(tiles) == batch_size:
+                    messages.put((index_job, 'tiles', tiles))
+                    tiles = []
+                    if not requests.empty():
+                        break  # continue later, the grower keeps its state
+            else:
+                todo.pop(0)
+                messages.put((index_job, 'tiles', tiles))
+                continue
+            messages.put((index_job, 'tiles', tiles))
+        except RuntimeError:
+            todo.pop(0)
+            growers[index_job] = None
+            messages.put((index_job, 'invalid', []))
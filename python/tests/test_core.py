@@ -0,0 +1,59 @@
+import copy
+
+import numpy as np
+import pytest
+
+from escher_maker.core import create_shape, get_all_combinations
+
+COMBINATIONS = get_all_combinations(3) + get_all_combinations(4) + get_all_combinations(6)
+
+
+def get_link_errors(shape):
+    # how far every linked node is from the image of its source node
+    tables = shape.get_link_tables()
+    positions = tables.get_positions()
+    return np.linalg.norm(np.einsum('nij,nj->ni', tables.matrices, positions[tables.sources]) + tables.offsets -
+                          positions[tables.targets], axis=1)
+
+
+@pytest.mark.parametrize('combination', COMBINATIONS, ids=str)
+def test_move_nodes_equals_move_node_for_every_node(combination):
+    # every node on its own, including the corners, whose links do not always go both ways
+    shape = create_shape(combination=combination)
+    for index_node in range(len(shape.get_nodes())):
+        shape_loop = copy.deepcopy(shape)
+        shape_batch = copy.deepcopy(shape)
+        shape_loop.move_node(shape_loop.get_nodes()[index_node], movement=np.array([0.03, -0.02]))
+        shape_batch.move_nodes([shape_batch.get_nodes()[index_node]], movements=[[0.03, -0.02]])
+        np.testing.assert_allclose(shape_batch.get_coordinates(smoothed_curves=False),
+                                   shape_loop.get_coordinates(smoothed_curves=False), atol=1e-12)
+
+
+@pytest.mark.parametrize('combination', COMBINATIONS, ids=str)
+def test_move_nodes_equals_move_node_loop(combination):
+    rng = np.random.default_rng(0)
+    shape = create_shape(combination=combination, nodes_per_segment=4)
+    for _ in range(5):
+        # all nodes, so also nodes that reach each other
+        indexes = rng.permutation(len(shape.get_nodes()))
+        movements = rng.normal(0, 0.02, size=(len(indexes), 2))
+        shape_loop = copy.deepcopy(shape)
+        for index_node, movement in zip(indexes, movements):
+            shape_loop.move_node(shape_loop.get_nodes()[index_node], movement=movement)
+        shape.move_nodes([shape.get_nodes()[index_node] for index_node in indexes], movements=movements)
+        np.testing.assert_allclose(shape.get_coordinates(smoothed_curves=False),
+                                   shape_loop.get_coordinates(smoothed_curves=False), atol=1e-12)
+
+
+@pytest.mark.parametrize('combination', COMBINATIONS, ids=str)
+def test_add_node_keeps_shared_nodes(combination):
+    rng = np.random.default_rng(0)
+    shape = create_shape(combination=combination)
+    for _ in range(5):
+        nodes = shape.get_nodes()
+        shape.add_node(nodes[rng.integers(len(nodes))])
+        for segment, next_segment in zip(shape.segments, shape.segments[1:] + shape.segments[:1]):
+            assert segment.nodes[-1] is next_segment.nodes[0]
+        for link in shape.links:
+            assert len(link.segment_source.nodes) == len(link.segment_linked.nodes)
+        assert np.max(get_link_errors(shape)) < 1e-9
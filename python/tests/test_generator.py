@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from escher_maker.core import get_all_combinations
+from escher_maker.generator import generate_random_patterns, generate_random_shapes
+
+COMBINATIONS = get_all_combinations(3) + get_all_combinations(4) + get_all_combinations(6)
+
+
+@pytest.mark.parametrize('combination', COMBINATIONS, ids=str)
+def test_random_shapes_keep_all_links(combination):
+    shapes, _ = generate_random_shapes(combination, 5, perturbation=0.5, seed=1)
+    assert len(shapes) > 0
+    for shape in shapes:
+        tables = shape.get_link_tables()
+        positions = tables.get_positions()
+        errors = np.linalg.norm(np.einsum('nij,nj->ni', tables.matrices, positions[tables.sources]) + tables.offsets -
+                                positions[tables.targets], axis=1)
+        assert np.max(errors) < 1e-9
+
+
+def test_random_shapes_depend_on_seed_only():
+    shapes_first, _ = generate_random_shapes([2, 3, 0, 1], 3, seed=4, batch_size=2)
+    shapes_second, _ = generate_random_shapes([2, 3, 0, 1], 3, seed=4, batch_size=2)
+    for shape_first, shape_second in zip(shapes_first, shapes_second):
+        np.testing.assert_array_equal(shape_first.get_coordinates(smoothed_curves=False),
+                                      shape_second.get_coordinates(smoothed_curves=False))
+
+
+def test_random_patterns_tile():
+    combinations = get_all_combinations(4) + get_all_combinations(6)
+    patterns, stats = generate_random_patterns(combinations, 2, seed=2)
+    assert stats['combinations'] == 16
+    assert stats['shapes'] > 0
+    for combination_patterns in patterns:
+        for pattern in combination_patterns:
+            pattern.extend(3)
+            assert len(pattern.tiles) > 1
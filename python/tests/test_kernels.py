@@ -0,0 +1,153 @@
+import copy
+
+import numpy as np
+import pytest
+
+from escher_maker import kernels
+from escher_maker.core import Tile, create_shape, get_all_combinations, make_pattern, rotation_matrix
+
+COMBINATIONS = get_all_combinations(3) + get_all_combinations(4) + [[3, 4, 5, 0, 1, 2], [1, 0, 3, 2, 5, 4]]
+
+
+@pytest.fixture(params=kernels.BACKENDS)
+def backend(request):
+    if request.param not in kernels.get_available_backends():
+        pytest.skip(f"Backend {request.param} is not available")
+    previous_backend = kernels.get_backend()
+    kernels.set_backend(request.param)
+    yield request.param
+    kernels.set_backend(previous_backend)
+
+
+# The pure Python versions from before the kernels, as reference
+
+def reference_update_linked_node(link, node):
+    new_pose = rotation_matrix(-link.segment_source.angle).dot(node.pos)
+    new_pose += [0, -link.segment_source.dist_for_center]
+    if link.flip_x:
+        new_pose *= [-1, 1]
+    if link.flip_y:
+        new_pose *= [1, -1]
+    new_pose += [0, link.segment_linked.dist_for_center]
+    link.get_linked_node(node).pos = rotation_matrix(link.segment_linked.angle).dot(new_pose)
+
+
+def reference_move_node(shape, node, movement):
+    if node.movable:
+        node.move(movement)
+        nodes_link_to_updated = [node]
+        nodes_updated = [node]
+        while len(nodes_link_to_updated) > 0:
+            node_link_to_updated = nodes_link_to_updated.pop(0)
+            for link in shape.links:
+                if node_link_to_updated in link.segment_source.nodes:
+                    linked_node = link.get_linked_node(node_link_to_updated)
+                    if linked_node not in nodes_updated:
+                        reference_update_linked_node(link, node_link_to_updated)
+                        nodes_updated.append(linked_node)
+                        nodes_link_to_updated.append(linked_node)
+
+
+def reference_tile_in_set(tiles, new_tile, eps=1e-5):
+    for tile in tiles:
+        diff_pos = abs(tile.pos - new_tile.pos)
+        diff_rot = abs(tile.rot - new_tile.rot)
+        if diff_rot > np.pi:
+            diff_rot -= 2 * np.pi
+        if all(diff_pos < eps):
+            return True, diff_rot < eps and tile.mirror == new_tile.mirror
+    return False, False
+
+
+def reference_make_pattern(combination, radius=1, max_distance=4.5):
+    # returns the tiles, or None when the combination does not give a valid pattern
+    nr_sides = len(combination)
+    tiles = [Tile()]
+    index_tile = 0
+    height = radius * np.cos(np.pi / nr_sides)
+    while index_tile < len(tiles):
+        tile = tiles[index_tile]
+        for index_side in range(nr_sides):
+            direction = tile.rot + 2 * np.pi / nr_sides * index_side * tile.mirror
+            if combination[index_side] >= 0:
+                side_match = combination[index_side]
+                mirror = tile.mirror
+            else:
+                side_match = -combination[index_side] - 1
+                mirror = -tile.mirror
+            new_tile = Tile(pos=tile.pos + 2 * height * np.array([np.sin(direction), np.cos(direction)]),
+                            rot=(direction - 2 * np.pi / nr_sides * side_match * mirror + np.pi) % (2 * np.pi),
+                            mirror=mirror)
+            inset = reference_tile_in_set(tiles, new_tile)
+            if np.linalg.norm(new_tile.pos) < max_distance * height:
+                if not inset[0]:
+                    tiles.append(new_tile)
+                elif not inset[1]:
+                    return None
+        index_tile += 1
+    return tiles
+
+
+def get_random_tables(rng, nr_of_nodes=40, nr_of_links=120):
+    positions = rng.normal(size=(nr_of_nodes, 2))
+    sources = rng.integers(nr_of_nodes, size=nr_of_links)
+    targets = rng.integers(nr_of_nodes, size=nr_of_links)
+    matrices = rng.normal(size=(nr_of_links, 2, 2))
+    offsets = rng.normal(size=(nr_of_links, 2))
+    return positions, sources, targets, matrices, offsets
+
+
+def test_propagate_links_loop_equals_numpy():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        positions, sources, targets, matrices, offsets = get_random_tables(rng)
+        start = int(rng.integers(len(positions)))
+        positions_loop = positions.copy()
+        positions_numpy = positions.copy()
+        order_loop = kernels._propagate_links_loop(positions_loop, sources, targets, matrices, offsets, start)
+        order_numpy = kernels._propagate_links_numpy(positions_numpy, sources, targets, matrices, offsets, start)
+        np.testing.assert_array_equal(order_loop, order_numpy)
+        np.testing.assert_array_equal(positions_loop, positions_numpy)
+
+
+def test_find_tile_loop_equals_numpy():
+    rng = np.random.default_rng(0)
+    positions = np.round(rng.normal(size=(50, 2)), 1)
+    rotations = rng.uniform(0, 2 * np.pi, size=50)
+    mirrors = rng.choice([-1.0, 1.0], size=50)
+    for _ in range(200):
+        index = int(rng.integers(50))
+        pos = positions[index] + rng.choice([0, 1e-6, 0.1], size=2)
+        rot = rotations[index] + rng.choice([0, 1e-6, 0.5])
+        mirror = mirrors[index] * rng.choice([-1.0, 1.0])
+        nr_of_tiles = int(rng.integers(1, 51))
+        assert (kernels._find_tile_loop(positions, rotations, mirrors, nr_of_tiles, pos, rot, mirror, 1e-5) ==
+                kernels._find_tile_numpy(positions, rotations, mirrors, nr_of_tiles, pos, rot, mirror, 1e-5))
+
+
+@pytest.mark.parametrize('combination', COMBINATIONS, ids=str)
+def test_move_node_equals_reference(backend, combination):
+    rng = np.random.default_rng(0)
+    shape = create_shape(combination=combination)
+    shape_reference = copy.deepcopy(shape)
+    for _ in range(20):
+        index_node = int(rng.integers(len(shape.get_nodes())))
+        movement = rng.normal(0, 0.05, size=2)
+        shape.move_node(shape.get_nodes()[index_node], movement=movement)
+        reference_move_node(shape_reference, shape_reference.get_nodes()[index_node], movement)
+    np.testing.assert_allclose(shape.get_coordinates(smoothed_curves=False),
+                               shape_reference.get_coordinates(smoothed_curves=False), atol=1e-12)
+
+
+@pytest.mark.parametrize('combination', COMBINATIONS, ids=str)
+def test_make_pattern_equals_reference(backend, combination):
+    tiles_reference = reference_make_pattern(combination)
+    pattern = make_pattern(combination, error_if_not_valid=False)
+    if tiles_reference is None:
+        assert pattern is None
+        return
+    assert len(pattern.tiles) == len(tiles_reference)
+    for tile, tile_reference in zip(pattern.tiles, tiles_reference):
+        np.testing.assert_allclose(tile.pos, tile_reference.pos, atol=1e-12)
+        assert tile.rot == pytest.approx(tile_reference.rot, abs=1e-12)
+        assert tile.mirror == tile_reference.mirror
@@ -0,0 +1,28 @@
+import json
+import shutil
+
+import pytest
+
+from escher_maker.core import make_pattern
+from escher_maker.serialization import index_pattern_directory, read_pattern_file, save_pattern
+
+
+@pytest.mark.parametrize('data', [{'a': 1}, [1, 2], [['Object_ref', 3]], 'pattern'], ids=repr)
+def test_read_pattern_file_rejects_other_json(tmp_path, data):
+    path = tmp_path / 'other.json'
+    path.write_text(json.dumps(data))
+    with pytest.raises(ValueError):
+        read_pattern_file(str(path))
+
+
+def test_index_pattern_directory_skips_files_that_are_not_a_pattern(tmp_path):
+    save_pattern(make_pattern([0, 1, 2], max_distance=2), str(tmp_path / 'pattern.json'))
+    shutil.copy(tmp_path / 'pattern.json', tmp_path / 'copy.json')
+    (tmp_path / 'dict.json').write_text(json.dumps({'a': 1}))
+    (tmp_path / 'list.json').write_text(json.dumps([1, 2]))
+    (tmp_path / 'broken.json').write_text('{')
+    (tmp_path / 'invalid.json').write_text(json.dumps({'tiles': 1, 'combination': [0, 1, 2], 'shape': 'square'}))
+    (tmp_path / 'reference.json').write_text(json.dumps([{'type': 'Pattern', 'tiles': ['Object_ref', 5]}]))
+    index = index_pattern_directory(str(tmp_path))
+    assert sorted(sorted(filenames) for filenames in index.values()) == [
+        [str(tmp_path / 'copy.json'), str(tmp_path / 'pattern.json')]]